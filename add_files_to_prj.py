@@ -4,85 +4,92 @@
 # Description:
 # This script is responsible for auto filling simulation .prj file containing
 # all project files. It's used by run_simulation script when executed with -prj flag.
+# The shared sources it looks up are also used by run_vunit script.
 # ------------------------------------------------------------------------------
 import os
+from hdl_deps import DependencyGraph
+from file_index import get_index
+from toolchain_cache import write_text_atomic
+
+HDL_EXTS = {".sv", ".v", ".vhd"}
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def shared_sources(sim_dir):
+    """
+    Absolute paths of the HDL sources shared by all tests, in lookup priority
+    order: sim/common, rtl and fpga directories of the project.
+    """
+    index = get_index(PROJECT_DIR)
+    sources = []
+    for source_dir in [os.path.join(sim_dir, "common"),
+                       os.path.join(PROJECT_DIR, "rtl"),
+                       os.path.join(PROJECT_DIR, "fpga")]:
+        sources += index.files(os.path.normpath(source_dir), HDL_EXTS)
+    return sources
 
 def generate_prj_file(test_name, sim_dir):
+    """Write the .prj file of a test. Returns True if its content changed."""
     prj_dir = os.path.join(sim_dir, test_name)
     os.makedirs(prj_dir, exist_ok=True)
 
     prj_path = os.path.join(prj_dir, f"{test_name}.prj")
 
-    script_dir = os.path.dirname(__file__)
-    project_dir = os.path.dirname(os.path.dirname(__file__))
-    rtl_root = os.path.normpath(os.path.join(script_dir, "../rtl"))  
-    common_dir = os.path.normpath(os.path.join(sim_dir, "common"))
-    fpga_dir = os.path.normpath(os.path.join(project_dir, "fpga"))
-
-    sv_files = []
-    v_files = []
-    vhdl_files = []
-
-    sim_parent_dir = os.path.dirname(sim_dir)
-
-    def collect_files(root_path, prefix, base_dir):
-        """Collect files and set relative paths correctly."""
-        for base, _, files in os.walk(root_path):
-            for f in files:
-                ext = os.path.splitext(f)[1].lower()
-                rel_path = os.path.relpath(os.path.join(base, f), start=base_dir)
-                rel_path = prefix + rel_path.replace("\\", "/") 
-                if ext == ".sv":
-                    sv_files.append(rel_path)
-                elif ext == ".v":
-                    v_files.append(rel_path)
-                elif ext == ".vhd":
-                    vhdl_files.append(rel_path)
-
-    collect_files(rtl_root, "../../", sim_parent_dir) 
-    collect_files(common_dir, "../", sim_dir)
-    collect_files(fpga_dir, "../", sim_dir)
-
-    for item in os.listdir(prj_dir):
-        full_path = os.path.join(prj_dir, item)
-        if os.path.isfile(full_path) and os.path.splitext(item)[1].lower() == ".sv":
+    # Absolute path -> path relative to the .prj file, in lookup priority order:
+    # test files first, so they can override shared modules
+    rel_paths = {}
+    index = get_index(PROJECT_DIR)
+
+    for full_path in index.files(prj_dir, {".sv"}):
+        if os.path.dirname(full_path) == os.path.abspath(prj_dir):
             rel_path = os.path.relpath(full_path, start=prj_dir).replace("\\", "/")
-            sv_files.append("./" + rel_path) 
-
-    def prioritize_pkg_if(files):
-        """Sort so that '_pkg' and '_if' files come first."""
-        pkg_if_files = [f for f in files if "_pkg" in f or "_if" in f]
-        other_files = [f for f in files if "_pkg" not in f and "_if" not in f]
-        return sorted(pkg_if_files) + sorted(other_files)
-
-    sv_files = prioritize_pkg_if(sv_files)
-    v_files.sort()
-    vhdl_files.sort()
-
-    with open(prj_path, "w") as f:
-        f.write("# Copyright (C) 2023  AGH University of Science and Technology\n")
-        f.write("# MTM UEC2\n")
-        f.write("# Author: Piotr Kaczmarczyk\n")
-        f.write("#\n")
-        f.write("# Description:\n")
-        f.write("# List of files defining the modules used during the test.\n")
-        f.write("# This file can be auto-generated using -prj flag of run_simulation script.\n")
-        f.write("# Specify the file paths relative to THIS file.\n")
-        f.write("# For syntax detail see AMD Xilinx UG 900:\n")
-        f.write("# https://docs.xilinx.com/r/en-US/ug900-vivado-logic-simulation/Project-File-.prj-Syntax\n")
-        f.write("\n")
-
-        if sv_files:
-            f.write("sv work ")
-            f.write(" \\\n        ".join(sv_files))
-            f.write(" \\\n\n")
-
-        if v_files:
-            f.write("verilog work ")
-            f.write(" \\\n            ".join(v_files))
-            f.write(" \\\n\n")
-
-        if vhdl_files:
-            f.write("vhdl work ")
-            f.write(" \\\n          ".join(vhdl_files))
-            f.write(" \\\n")
+            rel_paths[os.path.normpath(full_path)] = "./" + rel_path
+
+    for full_path in shared_sources(sim_dir):
+        rel_path = os.path.relpath(full_path, start=prj_dir).replace("\\", "/")
+        rel_paths.setdefault(os.path.normpath(full_path), rel_path)
+
+    # Keep only files reachable from the testbench, in dependency order
+    graph = DependencyGraph(rel_paths)
+    top = f"{test_name}_tb"
+    if top.lower() in graph.owner:
+        ordered = graph.compile_order([top, "glbl"])
+    else:
+        print(f"[WARNING] Module {top} not found, adding all project files to {prj_path}")
+        ordered = graph.compile_order()
+
+    def files_with_ext(ext):
+        return [rel_paths[path] for path in ordered if os.path.splitext(path)[1].lower() == ext]
+
+    sv_files = files_with_ext(".sv")
+    v_files = files_with_ext(".v")
+    vhdl_files = files_with_ext(".vhd")
+
+    text = ("# Copyright (C) 2023  AGH University of Science and Technology\n"
+            "# MTM UEC2\n"
+            "# Author: Piotr Kaczmarczyk\n"
+            "#\n"
+            "# Description:\n"
+            "# List of files defining the modules used during the test.\n"
+            "# This file can be auto-generated using -prj flag of run_simulation script.\n"
+            "# Specify the file paths relative to THIS file.\n"
+            "# For syntax detail see AMD Xilinx UG 900:\n"
+            "# https://docs.xilinx.com/r/en-US/ug900-vivado-logic-simulation/Project-File-.prj-Syntax\n"
+            "\n")
+
+    if sv_files:
+        text += "sv work " + " \\\n        ".join(sv_files) + " \\\n\n"
+
+    if v_files:
+        text += "verilog work " + " \\\n            ".join(v_files) + " \\\n\n"
+
+    if vhdl_files:
+        text += "vhdl work " + " \\\n          ".join(vhdl_files) + " \\\n"
+
+    # Rewriting an unchanged file would only wake up file watchers and caches
+    if os.path.isfile(prj_path):
+        with open(prj_path, "r") as f:
+            if f.read() == text:
+                return False
+    write_text_atomic(prj_path, text)
+    return True
@@ -8,8 +8,10 @@
 # ------------------------------------------------------------------------------
 import os
 import colorama
-
-colorama.init(autoreset=True)
+from hdl_deps import DependencyGraph
+from file_index import get_index
+from checkpoint_cache import references_tcl_rel
+from toolchain_cache import CACHE_DIR_NAME
 
 # -------------------------------------------------------------------------
 # Project parameters: adjust as needed
@@ -32,34 +34,21 @@ MEM_INIT_DIR         = os.path.join(PROJECT_DIR, "rtl")
 
 OUTPUT_TCL = os.path.join(FPGA_DIR, "scripts", "project_details.tcl")
 
+# IP output products are cached here (relative to fpga/), so cleaning fpga/build
+# doesn't force the IP to be synthesized again
+IP_CACHE_DIR = f"../{CACHE_DIR_NAME}/ip_cache"
+
 # -------------------------------------------------------------------------
 def collect_files_abs(root_dir, extensions):
     """
-    Recursively scan 'root_dir' (absolute path) for files with the given 'extensions',
-    returning a sorted list of absolute file paths.
+    Return a sorted list of absolute paths of files with the given 'extensions'
+    below 'root_dir' (absolute path). Files are looked up in the shared project
+    file index, so the tree is only walked once.
     """
-    collected = []
     if not os.path.isdir(root_dir):
-        return collected 
+        return []
 
-    for base, dirs, files in os.walk(root_dir):
-        for filename in files:
-            _, ext = os.path.splitext(filename)
-            if ext.lower() in extensions:
-                full_path = os.path.join(base, filename)
-                collected.append(os.path.abspath(full_path))
-
-    return sorted(collected)
-
-def prioritize_pkg_if(file_list):
-    """
-    Sort so that files containing '_pkg' or '_if' in their name appear first,
-    preserving alphabetical order in each group.
-    """
-    pkg_if = [f for f in file_list if ("_pkg" in os.path.basename(f).lower() 
-                                       or "_if"  in os.path.basename(f).lower())]
-    other  = [f for f in file_list if f not in pkg_if]
-    return sorted(pkg_if) + sorted(other)
+    return get_index(PROJECT_DIR).files(root_dir, extensions)
 
 # -------------------------------------------------------------------------
 def update_generate_bitstream_tcl():
@@ -70,7 +59,8 @@ def update_generate_bitstream_tcl():
       - <project>/rtl (parent)
       - fpga/mem (for memory .data files)
     Then writes them into fpga/scripts/project_details.tcl
-    using paths relative to fpga/.
+    using paths relative to fpga/. Returns absolute paths of all files the
+    build depends on (including `included files), for the bitstream cache.
     """
 
     xdc_abs = collect_files_abs(FPGA_CONSTRAINTS_DIR, {".xdc"})
@@ -89,18 +79,32 @@ def update_generate_bitstream_tcl():
     # Collect memory .data files
     mem_abs = collect_files_abs(MEM_INIT_DIR, {".data"})
 
-    def to_rel_fpga(path_list):
+    def to_rel_fpga(path_list, keep_order=False):
         rels = []
         for p in path_list:
             rel_path = os.path.relpath(p, start=FPGA_DIR)
             rel_path = rel_path.replace("\\", "/")
             rels.append(rel_path)
+        if keep_order:
+            return list(dict.fromkeys(rels))
         return sorted(set(rels))
 
+    # Keep only HDL files reachable from the top module, in dependency order
+    graph = DependencyGraph(sv_abs + v_abs + vhdl_abs)
+    if TOP_MODULE.lower() in graph.owner:
+        hdl_ordered = graph.compile_order([TOP_MODULE])
+    else:
+        print(colorama.Fore.YELLOW + f"[WARNING] Top module {TOP_MODULE} not found, adding all design files.")
+        hdl_ordered = graph.compile_order()
+
+    def ordered_with_ext(extensions):
+        return to_rel_fpga([p for p in hdl_ordered if os.path.splitext(p)[1].lower() in extensions],
+                           keep_order=True)
+
     xdc_files  = to_rel_fpga(xdc_abs)
-    sv_files   = prioritize_pkg_if(to_rel_fpga(sv_abs))
-    v_files    = to_rel_fpga(v_abs)
-    vhdl_files = to_rel_fpga(vhdl_abs)
+    sv_files   = ordered_with_ext({".sv"})
+    v_files    = ordered_with_ext({".v"})
+    vhdl_files = ordered_with_ext({".vhd", ".vhdl"})
     mem_files  = to_rel_fpga(mem_abs)
     xci_files  = to_rel_fpga(xci_abs)
 
@@ -147,7 +151,7 @@ set target {TARGET_FPGA}
         """
         if files:
             s = f"{comment}\nset {var_name} {{\n"
-            for fpath in sorted(files):
+            for fpath in files:
                 s += f"    {fpath}\n"
             s += "}\n\n"
         else:
@@ -164,13 +168,34 @@ set target {TARGET_FPGA}
     vhdl_section   = write_section("# Specify VHDL design files location", "vhdl_files", vhdl_files)
     mem_section    = write_section("# Specify files for a memory initialization", "mem_files", mem_files)
 
+    incremental_section = f"""\
+#-----------------------------------------------------#
+#               Incremental compilation               #
+#-----------------------------------------------------#
+# Reference checkpoints of the last build, managed by generate_bitstream script
+if {{[file exists {references_tcl_rel()}]}} {{
+    source {references_tcl_rel()}
+}}
+
+# IP cache kept outside fpga/build, set up when the first run is launched
+proc use_ip_cache {{args}} {{
+    trace remove execution launch_runs enter use_ip_cache
+    file mkdir {IP_CACHE_DIR}
+    config_ip_cache -use_cache_location [file normalize {IP_CACHE_DIR}]
+}}
+if {{[llength [info commands launch_runs]]}} {{
+    trace add execution launch_runs enter use_ip_cache
+}}
+"""
+
     new_tcl_content = (header 
                        + xci_section
                        + xdc_section
                        + sv_section
                        + verilog_section
                        + vhdl_section
-                       + mem_section)
+                       + mem_section
+                       + incremental_section)
 
     os.makedirs(os.path.dirname(OUTPUT_TCL), exist_ok=True)
     with open(OUTPUT_TCL, "w", encoding="utf-8") as f:
@@ -178,3 +203,5 @@ set target {TARGET_FPGA}
 
     print(colorama.Fore.GREEN + f"[INFO] Updated {OUTPUT_TCL} with new file lists (relative to fpga/).")
 
+    return xdc_abs + hdl_ordered + graph.include_closure(hdl_ordered) + xci_abs + mem_abs
+
@@ -0,0 +1,82 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Bitstream cache used by generate_bitstream script. After a successful build the
+# bitstream(s) and the warning summary are stored in the toolchain cache together
+# with a fingerprint of every build input: design sources (and their `includes),
+# constraints, IP and memory files, the tcl scripts, project parameters and the
+# Vivado version. When the fingerprint matches on the next run, the results are
+# restored and the whole Vivado flow is skipped.
+# ------------------------------------------------------------------------------
+import os
+import re
+import glob
+import shutil
+import hashlib
+from toolchain_cache import cache_dir, file_digest, write_text_atomic
+
+KEY_FILE = "key.txt"
+VIVADO_VERSION = re.compile(r"\d{4}\.\d+(?:\.\d+)?")
+
+
+def vivado_version(vivado_dir):
+    """Vivado version from its install path (e.g. C:/Xilinx/Vivado/2023.2/bin)."""
+    match = VIVADO_VERSION.findall(vivado_dir.replace("\\", "/"))
+    return match[-1] if match else os.path.normpath(vivado_dir)
+
+
+def build_fingerprint(input_files, tcl_dir, parameters, vivado_dir):
+    """
+    Hash the build inputs. 'parameters' are name/value pairs (project name, top
+    module, device) that change the result without changing any file.
+    """
+    key = hashlib.sha256()
+    key.update(vivado_version(vivado_dir).encode())
+    for name, value in sorted(parameters.items()):
+        key.update(f"{name}={value}\n".encode())
+    tcl_files = sorted(glob.glob(os.path.join(tcl_dir, "*.tcl")))
+    for path in sorted(set(input_files)) + tcl_files:
+        key.update(path.encode())
+        key.update(file_digest(path).encode())
+    return key.hexdigest()
+
+
+def _bitstream_cache(root_dir):
+    return cache_dir(root_dir, "bitstream")
+
+
+def restore_results(root_dir, key, results_dir):
+    """Copy cached results into 'results_dir' if the key matches. Returns the restored files or None."""
+    cached = _bitstream_cache(root_dir)
+    key_file = os.path.join(cached, KEY_FILE)
+
+    if not os.path.isfile(key_file):
+        return None
+    with open(key_file, "r") as f:
+        if f.read().strip() != key:
+            return None
+
+    files = [name for name in sorted(os.listdir(cached)) if name != KEY_FILE]
+    if not any(name.endswith(".bit") for name in files):
+        return None
+
+    os.makedirs(results_dir, exist_ok=True)
+    for name in files:
+        shutil.copy(os.path.join(cached, name), results_dir)
+    return files
+
+
+def store_results(root_dir, key, files):
+    """Save the bitstream(s) and warning summary of a finished build under 'key'."""
+    cached = _bitstream_cache(root_dir)
+    key_file = os.path.join(cached, KEY_FILE)
+    # Drop the key first, so an interrupted copy is never seen as valid
+    if os.path.exists(key_file):
+        os.remove(key_file)
+
+    for name in os.listdir(cached):
+        os.remove(os.path.join(cached, name))
+    for path in files:
+        shutil.copy(path, cached)
+    write_text_atomic(key_file, key)
@@ -0,0 +1,226 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Historical build metrics. After every bitstream build, generate_bitstream script
+# parses the timing summary, utilization report and per-stage elapsed time and
+# peak memory out of fpga/build and stores them in a SQLite database in the
+# toolchain cache, keyed by the git commit. The build directory itself can then
+# be cleaned as usual.
+# Usage: python build_metrics.py report [-n 10] [-m pattern]
+#        python build_metrics.py check [--time-limit 25] [--util-limit 80]
+# "check" compares the last build against the previous ones and exits with 1
+# on a regression, so it can be used as a CI step.
+
+import os
+import re
+import sys
+import glob
+import sqlite3
+import argparse
+import subprocess
+import statistics
+from datetime import datetime
+import colorama
+from toolchain_cache import cache_dir
+from impl_explore import parse_timing_summary
+from vtc_config import get_config
+
+DB_NAME = "build_metrics.db"
+
+# "route_design: Time (s): cpu = 00:01:02 ; elapsed = 00:00:48 . Memory (MB): peak = 2695.352 ; ..."
+STAGE_TIME = re.compile(r"^(\w+): Time \(s\): cpu = [\d:]+ ; elapsed = (\d+):(\d+):(\d+) \. "
+                        r"Memory \(MB\): peak = ([\d.]+)")
+STAGES = ["synth_design", "opt_design", "place_design", "phys_opt_design", "route_design", "write_bitstream"]
+
+# Rows of the utilization report, 7 series and UltraScale names
+UTIL_RESOURCES = ["Slice LUTs", "CLB LUTs", "Slice Registers", "CLB Registers",
+                  "Block RAM Tile", "DSPs", "Bonded IOB"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    commit_hash TEXT NOT NULL,
+    dirty INTEGER NOT NULL,
+    created TEXT NOT NULL,
+    project TEXT,
+    top_module TEXT,
+    target TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    build_id INTEGER NOT NULL REFERENCES builds(id),
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (build_id, name)
+);
+"""
+
+
+def open_db(root_dir):
+    db = sqlite3.connect(os.path.join(cache_dir(root_dir), DB_NAME))
+    db.executescript(SCHEMA)
+    return db
+
+
+def git_commit(root_dir):
+    """Return (commit hash, dirty flag) of the working tree."""
+    def git(*args):
+        process = subprocess.run(["git", *args], cwd=root_dir, capture_output=True, text=True)
+        return process.stdout.strip() if process.returncode == 0 else ""
+    return git("rev-parse", "HEAD") or "unknown", bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def parse_stage_times(log_file):
+    """Return {stage: (elapsed seconds, peak memory MB)} from a runme.log."""
+    stages = {}
+    with open(log_file, "r", errors="replace") as f:
+        for line in f:
+            match = STAGE_TIME.match(line)
+            if match and match.group(1) in STAGES:
+                hours, minutes, seconds = (int(match.group(i)) for i in (2, 3, 4))
+                stages[match.group(1)] = (hours * 3600 + minutes * 60 + seconds, float(match.group(5)))
+    return stages
+
+
+def parse_utilization(report_file):
+    """Return {resource: (used, util %)} from a report_utilization file."""
+    resources = {}
+    with open(report_file, "r", errors="replace") as f:
+        for line in f:
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) < 6 or fields[1].rstrip("*").strip() not in UTIL_RESOURCES:
+                continue
+            name = fields[1].rstrip("*").strip()
+            if name in resources:
+                continue
+            try:
+                resources[name] = (float(fields[2]), float(fields[-2].lstrip("<")))
+            except ValueError:
+                continue
+    return resources
+
+
+def collect_metrics(build_dir, top_module):
+    """Parse the metrics of the last build from the run directories in 'build_dir'."""
+    metrics = {}
+    for log_file in glob.glob(os.path.join(build_dir, "*.runs", "*", "runme.log")):
+        for stage, (elapsed, peak) in parse_stage_times(log_file).items():
+            metrics[f"time.{stage}"] = metrics.get(f"time.{stage}", 0) + elapsed
+            metrics[f"memory.{stage}"] = max(metrics.get(f"memory.{stage}", 0), peak)
+
+    for report in glob.glob(os.path.join(build_dir, "*.runs", "impl_*", f"{top_module}_timing_summary_routed.rpt"))[:1]:
+        timing = parse_timing_summary(report)
+        if timing:
+            metrics["timing.wns"], metrics["timing.tns"] = timing
+
+    for report in glob.glob(os.path.join(build_dir, "*.runs", "impl_*", f"{top_module}_utilization_placed.rpt"))[:1]:
+        for name, (used, percent) in parse_utilization(report).items():
+            metrics[f"util.{name}"] = used
+            metrics[f"util.{name} %"] = percent
+    return metrics
+
+
+def record_build(root_dir, build_dir, parameters):
+    """Store the metrics of the build in 'build_dir'. Returns the number of metrics stored."""
+    metrics = collect_metrics(build_dir, parameters["top_module"])
+    if not metrics:
+        return 0
+
+    commit, dirty = git_commit(root_dir)
+    with open_db(root_dir) as db:
+        cursor = db.execute("INSERT INTO builds (commit_hash, dirty, created, project, top_module, target) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (commit, int(dirty), datetime.now().isoformat(timespec="seconds"),
+                             parameters["project_name"], parameters["top_module"], parameters["target"]))
+        db.executemany("INSERT INTO metrics (build_id, name, value) VALUES (?, ?, ?)",
+                       [(cursor.lastrowid, name, value) for name, value in metrics.items()])
+    db.close()
+    return len(metrics)
+
+
+def load_builds(db, count):
+    """Return the last 'count' builds (oldest first) as (id, commit, dirty, created, {metric: value})."""
+    builds = db.execute("SELECT id, commit_hash, dirty, created FROM builds ORDER BY id DESC LIMIT ?",
+                        (count,)).fetchall()
+    result = []
+    for build_id, commit, dirty, created in reversed(builds):
+        metrics = dict(db.execute("SELECT name, value FROM metrics WHERE build_id = ?", (build_id,)))
+        result.append((build_id, commit, dirty, created, metrics))
+    return result
+
+
+def report(db, count, pattern):
+    builds = load_builds(db, count)
+    if not builds:
+        print("No builds recorded yet.")
+        return
+
+    names = sorted({name for *_, metrics in builds for name in metrics if re.search(pattern, name)})
+    print(f"{'build':<24}" + "".join(f"{name[:20]:>22}" for name in names))
+    previous = {}
+    for _, commit, dirty, created, metrics in builds:
+        row = f"{commit[:8] + ('+' if dirty else ''):<10}{created[5:16]:<14}"
+        for name in names:
+            value = metrics.get(name)
+            if value is None:
+                row += f"{'-':>22}"
+                continue
+            change = ""
+            if previous.get(name) and name.startswith(("time.", "memory.", "util.")):
+                change = f" ({(value - previous[name]) / previous[name] * 100:+.0f}%)"
+            row += f"{f'{value:g}{change}':>22}"
+        previous.update(metrics)
+        print(row)
+
+
+def check(db, history, time_limit, util_limit):
+    """Return the list of regressions of the last build against the median of the previous ones."""
+    builds = load_builds(db, history + 1)
+    if not builds:
+        return []
+    *older, (_, commit, _, _, last) = builds
+    regressions = []
+
+    for name, value in sorted(last.items()):
+        baseline = [metrics[name] for *_, metrics in older if name in metrics]
+        reference = statistics.median(baseline) if baseline else None
+
+        if name.startswith("time.") and reference and value > reference * (1 + time_limit / 100) and value - reference > 10:
+            regressions.append(f"{name} {value:g} s is {(value / reference - 1) * 100:.0f}% above the median {reference:g} s")
+        elif name == "timing.wns" and value < 0:
+            regressions.append(f"{name} {value:g} ns, timing not met")
+        elif name == "timing.wns" and reference is not None and value < reference - 0.1:
+            regressions.append(f"{name} {value:g} ns dropped from {reference:g} ns")
+        elif name.startswith("util.") and name.endswith("%") and value > util_limit:
+            regressions.append(f"{name[:-2]} at {value:g}% exceeds the {util_limit:g}% limit")
+    return [f"{commit[:8]}: {regression}" for regression in regressions]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show and check historical build metrics.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Show metrics of the last builds")
+    report_parser.add_argument("-n", type=int, default=10, help="Number of builds to show")
+    report_parser.add_argument("-m", default=r"^(time\.|timing\.wns|util\..*%)",
+                               help="Regular expression selecting the metrics to show")
+    check_parser = subparsers.add_parser("check", help="Flag regressions of the last build")
+    check_parser.add_argument("-n", type=int, default=5, help="Number of previous builds to compare with")
+    check_parser.add_argument("--time-limit", type=float, default=25, help="Allowed stage runtime increase in %%")
+    check_parser.add_argument("--util-limit", type=float, default=80, help="Maximum resource utilization in %%")
+    args = parser.parse_args(argv)
+
+    colorama.init(autoreset=True)
+    db = open_db(get_config("ROOT_DIR")["ROOT_DIR"])
+    if args.command == "report":
+        report(db, args.n, args.m)
+    else:
+        regressions = check(db, args.n, args.time_limit, args.util_limit)
+        for regression in regressions:
+            print(colorama.Fore.RED + f"[REGRESSION] {regression}")
+        if regressions:
+            sys.exit(1)
+        print(colorama.Fore.GREEN + "No regressions in the last build.")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Reference checkpoints for incremental synthesis and implementation, used by
+# generate_bitstream script. The post-synthesis and post-route checkpoints of the
+# last successful build are kept in the toolchain cache (git clean leaves them
+# alone), together with a references.tcl file that project_details.tcl sources.
+# It sets INCREMENTAL_CHECKPOINT of synth_1/impl_1 when the runs are launched.
+# Vivado falls back to a full run by itself when the design diverged too much;
+# a failed incremental build is retried without references by generate_bitstream.
+# The build fingerprint of the checkpoints is kept too, so strategy exploration
+# knows whether a synthesized checkpoint matches the current sources.
+# ------------------------------------------------------------------------------
+import os
+import glob
+import json
+import shutil
+from toolchain_cache import CACHE_DIR_NAME, cache_dir, file_digest, write_text_atomic
+
+CHECKPOINT_DIR_NAME = "checkpoints"
+REFERENCES_TCL = "references.tcl"
+PARAMS_FILE = "params.json"
+FINGERPRINT_FILE = "fingerprint.txt"
+
+# Run name -> (checkpoint written by the run, name in the cache)
+RUN_CHECKPOINTS = {
+    "synth_1": ("{top}.dcp", "post_synth.dcp"),
+    "impl_1":  ("{top}_routed.dcp", "post_route.dcp"),
+}
+
+REFERENCES_TEMPLATE = """\
+# Reference checkpoints of the last successful build, managed by generate_bitstream
+# script. Sourced by project_details.tcl, don't edit.
+set incremental_checkpoints {{
+{entries}}}
+
+proc set_incremental_checkpoints {{args}} {{
+    # Only before the first launch, changing a finished run makes it out of date
+    trace remove execution launch_runs enter set_incremental_checkpoints
+    foreach {{run dcp}} $::incremental_checkpoints {{
+        if {{[llength [get_runs -quiet $run]] && [file exists $dcp]}} {{
+            set_property INCREMENTAL_CHECKPOINT [file normalize $dcp] [get_runs $run]
+            puts "INFO: Using $dcp as incremental reference of $run"
+        }}
+    }}
+}}
+
+if {{[llength [info commands launch_runs]]}} {{
+    trace add execution launch_runs enter set_incremental_checkpoints
+}}
+"""
+
+
+def checkpoint_dir(root_dir):
+    return cache_dir(root_dir, CHECKPOINT_DIR_NAME)
+
+
+def references_tcl_rel():
+    """Location of references.tcl relative to the fpga directory, for project_details.tcl."""
+    return f"../{CACHE_DIR_NAME}/{CHECKPOINT_DIR_NAME}/{REFERENCES_TCL}"
+
+
+def drop_checkpoints(root_dir):
+    """Forget the reference checkpoints, the next build runs from scratch."""
+    shutil.rmtree(os.path.join(root_dir, CACHE_DIR_NAME, CHECKPOINT_DIR_NAME), ignore_errors=True)
+
+
+def has_checkpoints(root_dir):
+    return os.path.isfile(os.path.join(checkpoint_dir(root_dir), REFERENCES_TCL))
+
+
+def prepare_checkpoints(root_dir, parameters):
+    """
+    Keep the reference checkpoints only if they were built for the same project
+    parameters (top module, device). Returns True if references will be used.
+    """
+    params_file = os.path.join(checkpoint_dir(root_dir), PARAMS_FILE)
+    try:
+        with open(params_file, "r", encoding="utf-8") as f:
+            if json.load(f) == parameters:
+                return has_checkpoints(root_dir)
+    except (OSError, ValueError):
+        pass
+    drop_checkpoints(root_dir)
+    return False
+
+
+def store_checkpoints(root_dir, build_dir, top_module, parameters, fingerprint=None):
+    """
+    Save the checkpoints of a successful build from 'build_dir' as the next
+    references, with the build 'fingerprint' of their inputs.
+    """
+    found = {}
+    for run, (pattern, cached_name) in RUN_CHECKPOINTS.items():
+        matches = glob.glob(os.path.join(build_dir, "*.runs", run, pattern.format(top=top_module)))
+        if matches:
+            found[cached_name] = matches[0]
+    if not found:
+        return
+
+    drop_checkpoints(root_dir)
+    cached = checkpoint_dir(root_dir)
+    entries = ""
+    for run, (_, cached_name) in RUN_CHECKPOINTS.items():
+        if cached_name in found:
+            shutil.copy(found[cached_name], os.path.join(cached, cached_name))
+            entries += f"    {run} ../{CACHE_DIR_NAME}/{CHECKPOINT_DIR_NAME}/{cached_name}\n"
+
+    write_text_atomic(os.path.join(cached, PARAMS_FILE), json.dumps(parameters, sort_keys=True))
+    if fingerprint:
+        write_text_atomic(os.path.join(cached, FINGERPRINT_FILE), fingerprint)
+    # Written last, references are only used once all checkpoints are in place
+    write_text_atomic(os.path.join(cached, REFERENCES_TCL), REFERENCES_TEMPLATE.format(entries=entries))
+
+
+def checkpoint_matches(root_dir, synth_dcp, fingerprint):
+    """
+    True if 'synth_dcp' is the cached post-synthesis checkpoint (or a copy of it)
+    and it was built from inputs with the given build 'fingerprint'.
+    """
+    cached = checkpoint_dir(root_dir)
+    cached_dcp = os.path.join(cached, RUN_CHECKPOINTS["synth_1"][1])
+    try:
+        with open(os.path.join(cached, FINGERPRINT_FILE), "r") as f:
+            if f.read().strip() != fingerprint:
+                return False
+    except OSError:
+        return False
+    if not os.path.isfile(cached_dcp):
+        return False
+    return os.path.samefile(synth_dcp, cached_dcp) or file_digest(synth_dcp) == file_digest(cached_dcp)
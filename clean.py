@@ -3,33 +3,100 @@
 # Description:
 # Based on work of Piotr Kaczmarczyk, PhD, AGH University of Krakow.
 # Remove untracked files from the project.
+# Without arguments all ignored files are removed, except the toolchain cache.
+# Named scopes clean only a part of the project (e.g. "clean.py sim snapshots"),
+# and the cache scopes drop single caches. Use --list to show them.
 # To work properly, a git repository in the project directory is required.
 # Run from the project root directory.
 
 import os
+import shutil
+import argparse
 import subprocess
 import sys
 import colorama
+from toolchain_cache import CACHE_DIR_NAME, GIT_CLEAN_KEEP
+from vtc_config import get_config
 
-ENV_FILE = ".env"
-ROOT_DIR = None
+# Scope -> (paths relative to the project root, description)
+# Build scopes are cleaned with "git clean -X", only ignored files are removed
+BUILD_SCOPES = {
+    "sim":     (["sim"],     "Simulation build directories and logs"),
+    "vivado":  (["fpga"],    "Vivado project, runs and logs in fpga/"),
+    "results": (["results"], "Bitstreams, reports and traces in results/"),
+}
+# Cache scopes are directories of the toolchain cache, removed as a whole
+CACHE_SCOPES = {
+    "snapshots":   ([f"{CACHE_DIR_NAME}/elab"],        "Cached xelab snapshots"),
+    "simlib":      ([f"{CACHE_DIR_NAME}/xsim_lib"],    "Incrementally compiled simulation libraries"),
+    "ip":          ([f"{CACHE_DIR_NAME}/ip_cache"],    "Vivado IP cache (IP output products)"),
+    "checkpoints": ([f"{CACHE_DIR_NAME}/checkpoints"], "Reference checkpoints of incremental builds"),
+    "bitstream":   ([f"{CACHE_DIR_NAME}/bitstream"],   "Bitstream of the last build inputs"),
+    "unisim":      ([f"{CACHE_DIR_NAME}/vunit_unisim"], "Precompiled unisim libraries of VUnit runs"),
+}
 
-colorama.init(autoreset=True)
 
-if os.path.exists(ENV_FILE):
-    with open(ENV_FILE, "r") as f:
-        for line in f:
-            if line.startswith("ROOT_DIR="):
-                ROOT_DIR = line.strip().split("=")[1].strip('"')
+def git_clean(root_dir, paths=(), keep=()):
+    """
+    Remove ignored files below 'paths' (the whole project if empty), except the
+    toolchain cache and files matching the 'keep' patterns. Raises
+    CalledProcessError if git clean fails.
+    """
+    keep_args = list(GIT_CLEAN_KEEP)
+    for pattern in keep:
+        # Like the cache, a kept directory needs its whole subtree excluded, or files
+        # in it matching other ignore rules are still removed
+        if pattern.endswith("/") or os.path.isdir(os.path.join(root_dir, pattern)):
+            pattern = pattern.rstrip("/") + "/**"
+        keep_args += ["-e", f"!{pattern}"]
+    subprocess.run(["git", "clean", "-fdX", *keep_args, "--", *paths], cwd=root_dir, check=True)
 
-if not ROOT_DIR:
-    print(colorama.Fore.YELLOW + f"ROOT_DIR is not set. Run env.py first to initialize it.")
-    sys.exit(1)
 
-# Run git clean -fdX to remove untracked files
-try:
-    subprocess.run(["git", "clean", "-fdX"], cwd=ROOT_DIR, check=True)
-    print(colorama.Fore.GREEN + "Untracked files removed successfully.")
-except subprocess.CalledProcessError:
-    print(colorama.Fore.RED + "Error: Failed to clean untracked files. Make sure this is a valid git repository.")
-    sys.exit(1)
+def clean_scopes(root_dir, scopes, keep=()):
+    """Clean the given build and cache scopes."""
+    paths = [path for scope in scopes if scope in BUILD_SCOPES for path in BUILD_SCOPES[scope][0]]
+    if paths:
+        git_clean(root_dir, paths, keep)
+
+    for scope in scopes:
+        for path in CACHE_SCOPES.get(scope, ([], ""))[0]:
+            shutil.rmtree(os.path.join(root_dir, path), ignore_errors=True)
+
+
+def main(argv=None):
+    scopes = {**BUILD_SCOPES, **CACHE_SCOPES}
+    parser = argparse.ArgumentParser(description="Remove untracked files from the project.")
+    parser.add_argument("scopes", nargs="*", metavar="scope",
+                        help=f"Parts of the project to clean: {', '.join(scopes)} "
+                             "(default: everything except the toolchain cache)")
+    parser.add_argument("--keep", action="append", default=[], metavar="PATTERN",
+                        help="Never remove files matching this pattern (e.g. 'fpga/build/*.cache/')")
+    parser.add_argument("--list", action="store_true", help="List the available scopes")
+    args = parser.parse_args(argv)
+    for scope in args.scopes:
+        if scope not in scopes:
+            parser.error(f"unknown scope '{scope}', see --list")
+
+    colorama.init(autoreset=True)
+
+    if args.list:
+        for name, (paths, description) in scopes.items():
+            print(f"{name:<12} {description} ({', '.join(paths)})")
+        return
+
+    ROOT_DIR = get_config("ROOT_DIR")["ROOT_DIR"]
+
+    # Run git clean -fdX to remove untracked files, keeping the toolchain cache
+    try:
+        if args.scopes:
+            clean_scopes(ROOT_DIR, args.scopes, args.keep)
+        else:
+            git_clean(ROOT_DIR, keep=args.keep)
+        print(colorama.Fore.GREEN + "Untracked files removed successfully.")
+    except subprocess.CalledProcessError:
+        print(colorama.Fore.RED + "Error: Failed to clean untracked files. Make sure this is a valid git repository.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Elaboration cache used by run_simulation script. A snapshot produced by xelab
+# is stored in the toolchain cache together with a key built from the content of
+# every file listed in the test .prj (and the files they `include), the wcfg
+# file, the xelab options and the Vivado installation (settings script). When
+# the key matches on the next run, the snapshot is restored into the build
+# directory and xelab is skipped.
+# ------------------------------------------------------------------------------
+import os
+import shutil
+import hashlib
+from toolchain_cache import cache_dir, file_digest, write_text_atomic
+from hdl_deps import include_closure
+
+PRJ_LANGUAGES = {"sv", "verilog", "vhdl"}
+KEY_FILE = "key.txt"
+
+
+def prj_source_files(prj_path, include_missing=False):
+    """
+    Return absolute paths of all source files listed in a .prj file. Listed files
+    that don't exist are skipped, unless 'include_missing' is set (to match a
+    deleted source against changed files).
+    """
+    prj_dir = os.path.dirname(os.path.abspath(prj_path))
+    tokens = []
+
+    with open(prj_path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].split("//", 1)[0]
+            tokens += line.replace("\\", " ").split()
+
+    sources = []
+    expect_library = False
+    for token in tokens:
+        if token in PRJ_LANGUAGES:
+            expect_library = True
+            continue
+        if expect_library:
+            expect_library = False
+            continue
+        if token.startswith("-"):
+            continue
+        path = os.path.normpath(os.path.join(prj_dir, token))
+        if include_missing or os.path.isfile(path):
+            sources.append(path)
+    return sources
+
+
+def tool_id(setup_script):
+    """
+    Identify the Vivado installation by its resolved settings script path and
+    content, so snapshots of an older xelab are not reused after an upgrade.
+    """
+    setup_script = os.path.normcase(os.path.abspath(setup_script)) if setup_script else ""
+    if os.path.isfile(setup_script):
+        return f"{setup_script}:{file_digest(setup_script)}"
+    return setup_script
+
+
+def elab_key(prj_path, xelab_opts, extra_files=(), index=None, tool=""):
+    """
+    Hash the .prj closure, extra inputs (e.g. wcfg), the xelab option string and
+    the 'tool' identity (see tool_id). If a file index is given, its cached
+    content hashes are used.
+    """
+    digest = index.digest if index else file_digest
+    sources = prj_source_files(prj_path)
+    search_dirs = sorted({os.path.dirname(path) for path in sources})
+    key = hashlib.sha256()
+    key.update(tool.encode())
+    key.update(xelab_opts.encode())
+    for path in [prj_path, *sources, *include_closure(sources, search_dirs), *extra_files]:
+        key.update(path.encode())
+        key.update(digest(path).encode())
+    if index:
+        index.save()
+    return key.hexdigest()
+
+
+def _snapshot_cache(root_dir, snapshot):
+    return cache_dir(root_dir, "elab", snapshot)
+
+
+def restore_snapshot(root_dir, snapshot, key, build_dir):
+    """Copy a cached snapshot into 'build_dir' if its key matches. Returns True on a hit."""
+    cached = _snapshot_cache(root_dir, snapshot)
+    key_file = os.path.join(cached, KEY_FILE)
+    cached_snapshot = os.path.join(cached, "xsim.dir", snapshot)
+
+    if not os.path.isfile(key_file) or not os.path.isdir(cached_snapshot):
+        return False
+    with open(key_file, "r") as f:
+        if f.read().strip() != key:
+            return False
+
+    shutil.copytree(cached_snapshot, os.path.join(build_dir, "xsim.dir", snapshot), dirs_exist_ok=True)
+    return True
+
+
+def store_snapshot(root_dir, snapshot, key, build_dir):
+    """Save a freshly elaborated snapshot from 'build_dir' under 'key'."""
+    snapshot_dir = os.path.join(build_dir, "xsim.dir", snapshot)
+    if not os.path.isdir(snapshot_dir):
+        return
+
+    cached = _snapshot_cache(root_dir, snapshot)
+    key_file = os.path.join(cached, KEY_FILE)
+    # Drop the key first, so an interrupted copy is never seen as valid
+    if os.path.exists(key_file):
+        os.remove(key_file)
+
+    cached_snapshot = os.path.join(cached, "xsim.dir", snapshot)
+    shutil.rmtree(cached_snapshot, ignore_errors=True)
+    shutil.copytree(snapshot_dir, cached_snapshot)
+    write_text_atomic(key_file, key)
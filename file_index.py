@@ -0,0 +1,150 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Persistent index of project source files shared by add_files_to_prj and
+# add_files_to_tcl scripts. The project tree is scanned once and the result
+# (path, extension, mtime, size and content hash) is kept in the toolchain cache.
+# On the next run only directories whose mtime changed are listed again, and
+# file hashes are only recomputed for files whose mtime or size changed.
+# ------------------------------------------------------------------------------
+import os
+import json
+from toolchain_cache import CACHE_DIR_NAME, cache_dir, file_digest, write_text_atomic
+from phase_trace import span
+
+INDEX_FILE    = "file_index.json"
+INDEX_VERSION = 1
+
+# Directories (relative to the project root) that never contain sources
+EXCLUDED_DIRS = {".git", CACHE_DIR_NAME, "__pycache__", ".Xil",
+                 "sim/build", "fpga/build", "results"}
+
+
+class FileIndex:
+    """Cached view of all files below 'root_dir'."""
+
+    def __init__(self, root_dir):
+        self.root_dir = os.path.abspath(root_dir)
+        self.index_path = os.path.join(cache_dir(self.root_dir), INDEX_FILE)
+        self.dirs = {}
+        self.entries = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.dirs = data["dirs"]
+            self.entries = data["files"]
+
+    def save(self):
+        """Write the index back to the cache if anything changed."""
+        if not self._dirty:
+            return
+        data = {"version": INDEX_VERSION, "dirs": self.dirs, "files": self.entries}
+        write_text_atomic(self.index_path, json.dumps(data, separators=(",", ":")))
+        self._dirty = False
+
+    def refresh(self):
+        """Bring the index up to date with the file system."""
+        seen_dirs, seen_files = set(), set()
+        pending = [""]
+
+        while pending:
+            rel_dir = pending.pop()
+            abs_dir = os.path.join(self.root_dir, rel_dir)
+            try:
+                dir_mtime = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+            seen_dirs.add(rel_dir)
+
+            cached = self.dirs.get(rel_dir)
+            if cached is None or cached["mtime"] != dir_mtime:
+                # Directory content changed (or is new), list it again
+                files, subdirs = [], []
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                cached = {"mtime": dir_mtime, "files": sorted(files), "subdirs": sorted(subdirs)}
+                self.dirs[rel_dir] = cached
+                self._dirty = True
+
+            for name in cached["subdirs"]:
+                rel_sub = f"{rel_dir}/{name}" if rel_dir else name
+                if name not in EXCLUDED_DIRS and rel_sub not in EXCLUDED_DIRS:
+                    pending.append(rel_sub)
+
+            for name in cached["files"]:
+                rel_file = f"{rel_dir}/{name}" if rel_dir else name
+                self._update_file(rel_file)
+                seen_files.add(rel_file)
+
+        for stale in set(self.dirs) - seen_dirs:
+            del self.dirs[stale]
+            self._dirty = True
+        for stale in set(self.entries) - seen_files:
+            del self.entries[stale]
+            self._dirty = True
+        return self
+
+    def _update_file(self, rel_file):
+        try:
+            st = os.stat(os.path.join(self.root_dir, rel_file))
+        except OSError:
+            return
+        entry = self.entries.get(rel_file)
+        if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return
+        # Content hash is computed lazily, on the first digest() call
+        self.entries[rel_file] = {"ext": os.path.splitext(rel_file)[1].lower(),
+                                  "mtime": st.st_mtime_ns, "size": st.st_size, "hash": None}
+        self._dirty = True
+
+    def files(self, root_dir, extensions=None):
+        """Return sorted absolute paths of indexed files below 'root_dir' with one of 'extensions'."""
+        rel_root = os.path.relpath(os.path.abspath(root_dir), self.root_dir).replace("\\", "/")
+        prefix = "" if rel_root == "." else rel_root + "/"
+        if prefix.startswith("../"):
+            return []
+        return sorted(os.path.join(self.root_dir, *rel_file.split("/"))
+                      for rel_file, entry in self.entries.items()
+                      if rel_file.startswith(prefix) and (extensions is None or entry["ext"] in extensions))
+
+    def digest(self, path):
+        """Return the cached content hash of an indexed file, computing it if needed."""
+        rel_file = os.path.relpath(os.path.abspath(path), self.root_dir).replace("\\", "/")
+        if rel_file in self.entries:
+            # The file may have been rewritten since the last refresh
+            self._update_file(rel_file)
+        entry = self.entries.get(rel_file)
+        if entry is None:
+            return file_digest(path)
+        if entry["hash"] is None:
+            entry["hash"] = file_digest(path)
+            self._dirty = True
+        return entry["hash"]
+
+
+_indexes = {}
+
+def get_index(root_dir):
+    """
+    Return a refreshed index for 'root_dir', shared within this process. It is
+    refreshed on every call (only changed directories are listed again), so
+    long-lived callers like the watch mode see added and removed files.
+    """
+    root_dir = os.path.abspath(root_dir)
+    with span("file discovery"):
+        if root_dir not in _indexes:
+            _indexes[root_dir] = FileIndex(root_dir)
+        _indexes[root_dir].refresh().save()
+    return _indexes[root_dir]
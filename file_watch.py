@@ -0,0 +1,136 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Source file watcher used by the watch mode of run_simulation script. On Linux
+# the kernel inotify interface is used (through ctypes, no extra packages), on
+# other systems the watched directories are polled. Bursts of events (an editor
+# saving several files, or writing a temporary file and renaming it) are
+# collected until the tree has been quiet for a short moment, then reported
+# together as one set of changed paths.
+# ------------------------------------------------------------------------------
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+DEBOUNCE = 0.3      # seconds without events that end a burst
+POLL_INTERVAL = 0.5
+
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_Q_OVERFLOW  = 0x00004000
+IN_ISDIR       = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _walk_dirs(dirs, exclude):
+    for top in dirs:
+        for root, subdirs, _ in os.walk(top):
+            subdirs[:] = [d for d in subdirs if os.path.join(root, d) not in exclude]
+            yield root
+
+
+class _InotifyWatcher:
+    def __init__(self, dirs, exclude):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.exclude = exclude
+        self.paths = {}
+        for path in _walk_dirs(dirs, exclude):
+            self._add(path)
+
+    def _add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.paths[wd] = path
+
+    def read(self, timeout):
+        """Return paths changed within 'timeout' seconds (None: wait for the first event)."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed, offset = set(), 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW or wd not in self.paths:
+                continue
+            path = os.path.join(self.paths[wd], os.fsdecode(name))
+            if mask & IN_ISDIR:
+                # New directories are watched too, their files are reported by the walk
+                if mask & (IN_CREATE | IN_MOVED_TO) and path not in self.exclude:
+                    for new_dir in _walk_dirs([path], self.exclude):
+                        self._add(new_dir)
+                        changed.update(os.path.join(new_dir, f) for f in os.listdir(new_dir))
+            else:
+                changed.add(path)
+        return changed
+
+
+class _PollingWatcher:
+    def __init__(self, dirs, exclude):
+        self.dirs = dirs
+        self.exclude = exclude
+        self.state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for root in _walk_dirs(self.dirs, self.exclude):
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def read(self, timeout):
+        time.sleep(POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL))
+        state = self._scan()
+        changed = {path for path in state.keys() | self.state.keys() if state.get(path) != self.state.get(path)}
+        self.state = state
+        return changed
+
+
+def watch(dirs, extensions, exclude=(), debounce=DEBOUNCE, polling=False):
+    """
+    Yield sets of changed files with one of the 'extensions' below 'dirs',
+    one set per burst of changes. Directories in 'exclude' are not watched.
+    """
+    dirs = [os.path.abspath(d) for d in dirs if os.path.isdir(d)]
+    exclude = {os.path.abspath(d) for d in exclude}
+    watcher = None
+    if sys.platform.startswith("linux") and not polling:
+        try:
+            watcher = _InotifyWatcher(dirs, exclude)
+        except (OSError, AttributeError):
+            watcher = None
+    watcher = watcher or _PollingWatcher(dirs, exclude)
+
+    def relevant(paths):
+        return {p for p in paths if os.path.splitext(p)[1].lower() in extensions}
+
+    while True:
+        changed = relevant(watcher.read(None))
+        if not changed:
+            continue
+        # Keep collecting until the burst is over
+        while True:
+            more = relevant(watcher.read(debounce))
+            if not more:
+                break
+            changed |= more
+        yield changed
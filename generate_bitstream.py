@@ -8,6 +8,12 @@
 # automatically by the apropriate script. When finished, the bitstream is copied to
 # the result directory. Additionally, all warnings and errors logged during
 # synthesis and implementation are also copied to results/warning_summary.log.
+# If no build input changed since the last build, the cached bitstream and warning
+# summary are restored instead (use -f to force a rebuild). Checkpoints of the last
+# successful build are kept as references for incremental synthesis and
+# implementation (use -full to build from scratch). With -x N, the last synthesized
+# design is implemented with N placer/router strategies in parallel and only the
+# bitstream with the best timing is kept.
 # To work properly, a git repository in the project directory is required.
 # ------------------------------------------------------------------------------
 
@@ -16,36 +22,20 @@ import glob
 import subprocess
 import shutil
 import sys
+import time
+import argparse
 import colorama
-from add_files_to_tcl import update_generate_bitstream_tcl
-
-ENV_FILE   = ".env"
-ROOT_DIR   = None
-VIVADO_DIR = None
-
-colorama.init(autoreset=True)
-
-if os.path.exists(ENV_FILE):
-    with open(ENV_FILE, "r") as f:
-        for line in f:
-            if line.startswith("ROOT_DIR="):
-                ROOT_DIR = line.strip().split("=")[1].strip('"')
-            elif line.startswith("VIVADO_DIR="):
-                VIVADO_DIR = line.strip().split("=")[1].strip('"')
-
-if not ROOT_DIR:
-    print(colorama.Fore.YELLOW + "ROOT_DIR is not set. Run env.py first to initialize it.")
-    sys.exit(1)
-
-if not VIVADO_DIR:
-    print(colorama.Fore.YELLOW + "VIVADO_DIR is not set. Run env.py first to initialize it.")
-    sys.exit(1)
-
-vivado_executable = os.path.join(VIVADO_DIR, "vivado.bat")
-
-if not os.path.exists(vivado_executable):
-    print(colorama.Fore.RED + f"Error: Vivado executable not found at {vivado_executable}.")
-    sys.exit(1)
+from add_files_to_tcl import PROJECT_NAME, TOP_MODULE, TARGET_FPGA, update_generate_bitstream_tcl
+from bitstream_cache import build_fingerprint, restore_results, store_results
+from checkpoint_cache import checkpoint_matches, drop_checkpoints, prepare_checkpoints, store_checkpoints
+from build_metrics import parse_stage_times, record_build
+from phase_trace import finish as finish_trace, record as record_span, span
+from impl_explore import STRATEGIES, SUMMARY_FILE, explore, find_synth_checkpoint
+from vivado_session import VivadoSessionError, connect
+from vtc_config import get_config
+from clean import clean_scopes
+
+TRACE_FILE = "trace_generate_bitstream.json"
 
 def list_bit_files(search_path="."):
     """
@@ -61,47 +51,176 @@ def list_bit_files(search_path="."):
 
     return bit_files
 
+def trace_vivado_stages(build_dir, start):
+    """Add the Vivado stages from the run logs to the trace, one after another from 'start'."""
+    run_logs = glob.glob(os.path.join(build_dir, "*.runs", "*", "runme.log"))
+    # Synthesis runs (including out-of-context IP runs) come before implementation
+    for log_file in sorted(run_logs, key=lambda path: (os.path.basename(os.path.dirname(path)).startswith("impl"), path)):
+        run_name = os.path.basename(os.path.dirname(log_file))
+        for stage, (elapsed, peak) in parse_stage_times(log_file).items():
+            record_span(stage, start, start + elapsed, "vivado", run=run_name, peak_memory_mb=peak)
+            start += elapsed
+
+def run_flow(session, root_dir, vivado_executable):
+    """Clean the fpga directory and run generate_bitstream.tcl. Returns the built bitstreams."""
+    fpga_dir = os.path.join(root_dir, "fpga")
+    if session:
+        # Release the previous project, so its files can be cleaned
+        session.run("catch {close_project}")
+
+    # Only the Vivado project is stale, the IP cache and checkpoints live in the toolchain cache
+    with span("git clean"):
+        try:
+            clean_scopes(root_dir, ["vivado"])
+        except subprocess.CalledProcessError:
+            print(colorama.Fore.YELLOW + "[WARNING] Failed to clean the fpga directory.")
+
+    main_tcl = os.path.join(fpga_dir, "scripts", "generate_bitstream.tcl")
+    start_time = time.time()
+    with span("vivado", "vivado"):
+        if session:
+            print(colorama.Fore.CYAN + f"[INFO] Using running Vivado session (port {session.port}).")
+            try:
+                print(session.source(main_tcl, fpga_dir), end="")
+            except VivadoSessionError as e:
+                print(str(e), end="")
+                print(colorama.Fore.RED + "Error: generate_bitstream.tcl failed in the Vivado session.")
+                return []
+        else:
+            command = f'"{vivado_executable}" -mode tcl -source "{main_tcl}"'
+            subprocess.run(command, shell=True, cwd=fpga_dir)
+    trace_vivado_stages(os.path.join(fpga_dir, "build"), start_time)
+
+    return list_bit_files(os.path.join(fpga_dir, "build"))
+
+def explore_strategies(runs, jobs, root_dir, vivado_executable, fingerprint):
+    """
+    Implement the synthesized design with several strategies and keep the best
+    bitstream. It is also stored in the bitstream cache under 'fingerprint', but
+    only if the checkpoint is known to be synthesized from the same inputs.
+    """
+    build_dir = os.path.join(root_dir, "fpga", "build")
+    results_dir = os.path.join(root_dir, "results")
+    synth_dcp = find_synth_checkpoint(root_dir, build_dir, TOP_MODULE)
+    if not synth_dcp:
+        print(colorama.Fore.RED + "Error: No synthesized checkpoint found. Run generate_bitstream first.")
+        sys.exit(1)
+
+    print(colorama.Fore.CYAN + f"[INFO] Implementing {synth_dcp}")
+    best = explore(vivado_executable, synth_dcp, build_dir, results_dir, f"{TOP_MODULE}.bit", runs, jobs)
+    if not best:
+        print(colorama.Fore.RED + "Error: All implementation runs failed.")
+        sys.exit(1)
+    # Otherwise the next unchanged build restores the older cached bitstream over it
+    if checkpoint_matches(root_dir, synth_dcp, fingerprint):
+        store_results(root_dir, fingerprint, [os.path.join(results_dir, f"{TOP_MODULE}.bit")])
+    else:
+        print(colorama.Fore.YELLOW + "[WARNING] The synthesized checkpoint may be older than the sources, "
+              "the bitstream is not cached. Run generate_bitstream first to implement the current design.")
+    print(colorama.Fore.GREEN + f"Best strategy {best}, bitstream copied to {results_dir} "
+          f"(see {SUMMARY_FILE} for all runs).")
+
 # ------------------------------------------------------------------------------
 # MAIN script flow
-#  1) Update project_details.tcl with fresh file lists
+#  1) Update project_details.tcl with fresh file lists, restore cached results
+#     if no build input changed
 #  2) Clean untracked files
-#  3) Run Vivado
-#  4) Copy bitstream + run warning summary
+#  3) Run Vivado (in a running Vivado session, if there is one), incrementally
+#     if reference checkpoints are available, retried from scratch on failure
+#  4) Copy bitstream + run warning summary, store them and checkpoints in the cache,
+#     record the build metrics
 # ------------------------------------------------------------------------------
-def main():
-    # (1) Update the .tcl file with fresh list of sources
-    update_generate_bitstream_tcl()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the bitstream with Vivado.")
+    parser.add_argument("-f", action="store_true", help="Rebuild even if no build input changed")
+    parser.add_argument("-full", action="store_true", help="Don't use reference checkpoints of the last build")
+    parser.add_argument("-x", type=int, metavar="N", choices=range(1, len(STRATEGIES) + 1),
+                        help=f"Implement the last synthesized design with N (max {len(STRATEGIES)}) strategies in parallel")
+    parser.add_argument("-j", type=int, help="Number of parallel implementation runs (use with -x, default: fit cores and memory)")
+    args = parser.parse_args(argv)
+
+    colorama.init(autoreset=True)
+    config = get_config("ROOT_DIR", "VIVADO_DIR")
+    ROOT_DIR = config["ROOT_DIR"]
+    VIVADO_DIR = config["VIVADO_DIR"]
+
+    vivado_executable = os.path.join(VIVADO_DIR, "vivado.bat")
+    if not os.path.exists(vivado_executable):
+        print(colorama.Fore.RED + f"Error: Vivado executable not found at {vivado_executable}.")
+        sys.exit(1)
 
-    # (2) Clean untracked files in the fpga directory
-    subprocess.run(["git", "clean", "-fXd", "fpga"], cwd=ROOT_DIR)
+    fpga_dir    = os.path.join(ROOT_DIR, "fpga")
+    results_dir = os.path.join(ROOT_DIR, "results")
 
-    # (3) Run Vivado in TCL mode to generate the bitstream
-    fpga_dir   = os.path.join(ROOT_DIR, "fpga")
-    main_tcl   = os.path.join(fpga_dir, "scripts", "generate_bitstream.tcl")
-    command    = f'"{vivado_executable}" -mode tcl -source "{main_tcl}"'
-    subprocess.run(command, shell=True, cwd=fpga_dir)
+    # (1) Update the .tcl file with fresh list of sources
+    with span("tcl generation"):
+        input_files = update_generate_bitstream_tcl()
+    parameters  = {"project_name": PROJECT_NAME, "top_module": TOP_MODULE, "target": TARGET_FPGA}
+    with span("build fingerprint"):
+        fingerprint = build_fingerprint(input_files, os.path.join(fpga_dir, "scripts"), parameters, VIVADO_DIR)
+
+    if args.x:
+        explore_strategies(args.x, args.j, ROOT_DIR, vivado_executable, fingerprint)
+        return
+
+    if not args.f:
+        restored = restore_results(ROOT_DIR, fingerprint, results_dir)
+        if restored:
+            print(colorama.Fore.CYAN + f"[INFO] Build inputs unchanged, restored {', '.join(restored)} to {results_dir}")
+            finish_trace(os.path.join(results_dir, TRACE_FILE), "generate_bitstream")
+            return
+
+    if args.full:
+        drop_checkpoints(ROOT_DIR)
+    incremental = prepare_checkpoints(ROOT_DIR, parameters)
+
+    # A session started with vivado_session.py saves the tool startup
+    session = connect(ROOT_DIR)
+
+    # (2) + (3) Clean untracked files and run Vivado in TCL mode to generate the bitstream
+    if incremental:
+        print(colorama.Fore.CYAN + "[INFO] Using checkpoints of the last build as incremental references.")
+    bitstream_files = run_flow(session, ROOT_DIR, vivado_executable)
+
+    if not bitstream_files and incremental:
+        print(colorama.Fore.YELLOW + "[WARNING] Incremental build failed, retrying without reference checkpoints.")
+        drop_checkpoints(ROOT_DIR)
+        bitstream_files = run_flow(session, ROOT_DIR, vivado_executable)
 
     # (4) Copy generated bitstream to results directory
-    bitstream_files = list_bit_files(os.path.join(fpga_dir, "build"))
     if not bitstream_files:
         print(colorama.Fore.RED + "Error: No bitstream (.bit) file found in fpga/build.")
         sys.exit(1)
 
-    results_dir = os.path.join(ROOT_DIR, "results")
     os.makedirs(results_dir, exist_ok=True)
 
-    for bitstream_file in bitstream_files:
-        shutil.copy(bitstream_file, results_dir)
+    with span("bitstream copy"):
+        for bitstream_file in bitstream_files:
+            shutil.copy(bitstream_file, results_dir)
     print(f"Copied bitstream(s) to {results_dir}")
 
     # Run warning summary script
     warning_summary_script = os.path.join(ROOT_DIR, "tools", "warning_summary.py")
     if os.path.exists(warning_summary_script):
-        subprocess.run(["python", warning_summary_script], cwd=ROOT_DIR)
+        with span("log scanning"):
+            subprocess.run(["python", warning_summary_script], cwd=ROOT_DIR)
     else:
         print("Warning: warning_summary.py not found in tools/ directory.")
 
+    cached_files = list(bitstream_files)
+    warning_log = os.path.join(results_dir, "warning_summary.log")
+    if os.path.exists(warning_log):
+        cached_files.append(warning_log)
+    with span("cache store"):
+        store_results(ROOT_DIR, fingerprint, cached_files)
+        store_checkpoints(ROOT_DIR, os.path.join(fpga_dir, "build"), TOP_MODULE, parameters, fingerprint)
+
+    # Keep timing, utilization and runtime of the build, fpga/build is wiped by the next run
+    if record_build(ROOT_DIR, os.path.join(fpga_dir, "build"), parameters):
+        print("Build metrics recorded, see 'python build_metrics.py report'.")
+
     print(colorama.Fore.GREEN + "Bitstream generation and logging completed successfully.")
+    finish_trace(os.path.join(results_dir, TRACE_FILE), "generate_bitstream")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,202 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Lightweight HDL dependency scanner. It finds module, interface, package and
+# entity declarations in SystemVerilog, Verilog and VHDL sources together with
+# the units each file uses (imports, instantiations, `include). From that a
+# dependency graph is built and a compile order is produced, containing only
+# the files reachable from the given top units. VHDL architectures and package
+# bodies in separate files are pulled in together with the unit they implement. Used by add_files_to_prj and
+# add_files_to_tcl scripts.
+# ------------------------------------------------------------------------------
+import os
+import re
+
+VERILOG_EXTS = {".sv", ".v", ".svh", ".vh"}
+VHDL_EXTS    = {".vhd", ".vhdl"}
+
+# -------------------------------------------------------------------------
+# (System)Verilog patterns
+# -------------------------------------------------------------------------
+SV_COMMENT    = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+SV_STRING     = re.compile(r'"(?:\\.|[^"\\])*"')
+SV_INCLUDE    = re.compile(r'`include\s+"([^"]+)"')
+SV_VIRTUAL_IF = re.compile(r"\bvirtual\s+interface\b")
+SV_DECL       = re.compile(r"\b(module|macromodule|interface|package|program|primitive)\s+"
+                           r"(?:(?:automatic|static)\s+)?([A-Za-z_]\w*)")
+SV_SCOPE_USE  = re.compile(r"\b([A-Za-z_]\w*)\s*::")
+SV_PARAM_INST = re.compile(r"\b([A-Za-z_]\w*)\s*#\s*\(")
+SV_INST       = re.compile(r"\b([A-Za-z_]\w*)\s+([A-Za-z_]\w*)\s*(?:\[[^\]]*\]\s*)*\(")
+SV_IDENT      = re.compile(r"\b[A-Za-z_]\w*\b")
+
+# -------------------------------------------------------------------------
+# VHDL patterns (case-insensitive language, names are stored lowercase)
+# -------------------------------------------------------------------------
+VHDL_COMMENT     = re.compile(r"--[^\n]*")
+VHDL_DECL        = re.compile(r"^\s*(entity|package)\s+(?!body\b)(\w+)\s+is\b", re.I | re.M)
+VHDL_USE         = re.compile(r"\buse\s+\w+\.(\w+)", re.I)
+VHDL_ENTITY_INST = re.compile(r"\bentity\s+\w+\.(\w+)", re.I)
+VHDL_COMP_INST   = re.compile(r"\b\w+\s*:\s*(?:component\s+)?(\w+)\s+(?:generic|port)\s+map\b", re.I)
+VHDL_PKG_BODY    = re.compile(r"\bpackage\s+body\s+(\w+)", re.I)
+VHDL_ARCH        = re.compile(r"\barchitecture\s+\w+\s+of\s+(\w+)", re.I)
+
+
+class HdlUnits:
+    """Units declared and used by a single source file."""
+
+    def __init__(self, defines=(), uses=(), idents=(), includes=(), interfaces=(), packages=(), implements=()):
+        self.defines    = set(defines)
+        self.uses       = set(uses)
+        self.idents     = set(idents)
+        self.includes   = list(includes)
+        self.interfaces = set(interfaces)
+        self.packages   = set(packages)
+        # Units whose architecture or package body this file contains
+        self.implements = set(implements)
+
+
+def scan_text(text, ext):
+    """Extract declared units, used units and `include names from HDL source text."""
+    if ext.lower() in VHDL_EXTS:
+        text = VHDL_COMMENT.sub("", text)
+        decls = [(kind.lower(), name.lower()) for kind, name in VHDL_DECL.findall(text)]
+        defines = {name for _, name in decls}
+        packages = {name for kind, name in decls if kind == "package"}
+        implements = {name.lower() for pattern in (VHDL_ARCH, VHDL_PKG_BODY) for name in pattern.findall(text)}
+        uses = {name.lower() for pattern in (VHDL_USE, VHDL_ENTITY_INST, VHDL_COMP_INST)
+                for name in pattern.findall(text)} | implements
+        return HdlUnits(defines, uses, packages=packages, implements=implements)
+
+    text = SV_COMMENT.sub("", text)
+    includes = SV_INCLUDE.findall(text)
+    text = SV_STRING.sub('""', text)
+    text = SV_VIRTUAL_IF.sub("virtual", text)
+
+    decls = [(kind, name.lower()) for kind, name in SV_DECL.findall(text) if name != "class"]
+    defines = {name for _, name in decls}
+    interfaces = {name for kind, name in decls if kind == "interface"}
+    packages = {name for kind, name in decls if kind == "package"}
+    uses = {name.lower() for name in SV_SCOPE_USE.findall(text)}
+    uses.update(name.lower() for name in SV_PARAM_INST.findall(text))
+    uses.update(name.lower() for name, _ in SV_INST.findall(text))
+    # Interfaces can be referenced as plain port or variable types, so every
+    # identifier is kept and matched against known interfaces later
+    idents = {name.lower() for name in SV_IDENT.findall(text)}
+    return HdlUnits(defines, uses, idents, includes, interfaces, packages)
+
+
+def scan_file(path):
+    """Scan a single HDL file."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return scan_text(f.read(), os.path.splitext(path)[1])
+
+
+def resolve_include(name, including_file, search_dirs=()):
+    """Find an `include file next to the including file or in one of 'search_dirs'."""
+    for directory in (os.path.dirname(including_file), *search_dirs):
+        candidate = os.path.normpath(os.path.join(directory, name))
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+class DependencyGraph:
+    """
+    File level dependency graph. Files are given in priority order: when a unit
+    is declared in several files, the first one wins.
+    """
+
+    def __init__(self, files, scanner=scan_file):
+        self.files = list(dict.fromkeys(os.path.normpath(f) for f in files))
+        self.units = {path: scanner(path) for path in self.files}
+
+        self.owner = {}
+        interfaces = set()
+        for path in self.files:
+            for name in self.units[path].defines:
+                self.owner.setdefault(name, path)
+            interfaces |= self.units[path].interfaces
+
+        self.search_dirs = sorted({os.path.dirname(path) for path in self.files})
+        self.deps = {}
+        for path in self.files:
+            units = self.units[path]
+            used = units.uses | (units.idents & interfaces)
+            self.deps[path] = sorted({self.owner[name] for name in used
+                                      if name in self.owner and self.owner[name] != path})
+
+        # Declaring file -> files with its architectures / package bodies, which
+        # are needed whenever the declaration is
+        self.companions = {}
+        for path in self.files:
+            for name in self.units[path].implements:
+                if name in self.owner and self.owner[name] != path:
+                    self.companions.setdefault(self.owner[name], []).append(path)
+
+    def compile_order(self, tops=None):
+        """
+        Return files in dependency order (dependencies first). If 'tops' is given,
+        only files reachable from those units are returned, together with the
+        architectures and package bodies of the reachable units. Unknown tops are ignored;
+        if none of them is found, None is returned.
+        """
+        if tops is None:
+            roots = self.files
+        else:
+            roots = [self.owner[top.lower()] for top in tops if top.lower() in self.owner]
+            if not roots:
+                return None
+
+        ordered, visited = [], set()
+        for root in roots:
+            if root in visited:
+                continue
+            visited.add(root)
+            # Iterative post-order DFS, cycles are broken at the first revisit
+            stack = [(root, iter(self.deps[root]))]
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    ordered.append(node)
+                    # Companions depend on 'node', so they are ordered after it
+                    for companion in self.companions.get(node, []):
+                        if companion not in visited:
+                            visited.add(companion)
+                            stack.append((companion, iter(self.deps[companion])))
+                elif child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(self.deps[child])))
+        return ordered
+
+    def compile_time_deps(self, path):
+        """
+        Dependencies that 'path' has to be recompiled after: files declaring
+        packages or interfaces it uses. VHDL design units depend on everything
+        they reference.
+        """
+        if os.path.splitext(path)[1].lower() in VHDL_EXTS:
+            return list(self.deps[path])
+        return [dep for dep in self.deps[path]
+                if self.units[dep].packages or self.units[dep].interfaces]
+
+    def include_closure(self, files):
+        """Return all files pulled in with `include by the given files."""
+        return include_closure(files, self.search_dirs)
+
+
+def include_closure(files, search_dirs=()):
+    """Return all files pulled in, also indirectly, with `include by the given files."""
+    found, pending = [], list(files)
+    while pending:
+        path = pending.pop()
+        if os.path.splitext(path)[1].lower() not in VERILOG_EXTS:
+            continue
+        for name in scan_file(path).includes:
+            inc = resolve_include(name, path, search_dirs)
+            if inc and inc not in found:
+                found.append(inc)
+                pending.append(inc)
+    return sorted(found)
@@ -0,0 +1,134 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Batch version of img2dat and img2dat_new scripts. Converts all images in a
+# directory (or matching a glob pattern) in a pool of worker processes.
+# A manifest keeps the hash of every source image and output file together with
+# the conversion parameters, so images whose ROM file is up to date are skipped.
+# Usage: python img2dat_batch.py <directory|glob> [--format dat|data] [-j N]
+
+import os
+import sys
+import glob
+import json
+import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from toolchain_cache import file_digest, write_text_atomic
+
+CONVERTER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img_rom.py")
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff"}
+MANIFEST_NAME = ".img2dat_manifest.json"
+
+# Conversion parameters of the single image scripts
+FORMATS = {
+    "dat":  {"extension": ".dat",  "size": None,     "resample": "LANCZOS", "bits_per_channel": 4, "header": True},   # img2dat
+    "data": {"extension": ".data", "size": [64, 64], "resample": "LANCZOS", "bits_per_channel": 4, "header": False},  # img2dat_new
+}
+
+
+def find_images(source):
+    """Return sorted image paths from a directory (recursively) or a glob pattern."""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "**", "*"), recursive=True)
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and os.path.splitext(p)[1].lower() in IMAGE_EXTS)
+
+
+def output_path(image_file, extension):
+    """Same naming as img_rom.output_path, without importing PIL and NumPy."""
+    return re.sub(r"\.[a-zA-Z0-9]*$", extension, image_file)
+
+
+def convert(image_file, output_file, params):
+    """Worker: convert one image and return the hash of the produced file."""
+    # Imported here, so an up to date batch never pays for PIL and NumPy
+    from img_rom import convert_image
+    convert_image(image_file, output_file, size=params["size"],
+                  resample=params["resample"], header=params["header"])
+    return file_digest(output_file)
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_current(entry, source_hash, params, output_file):
+    """Check a manifest entry against the current source image, parameters and output."""
+    return (entry is not None
+            and entry["source_hash"] == source_hash
+            and entry["params"] == params
+            and os.path.isfile(output_file)
+            and file_digest(output_file) == entry["output_hash"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert images to ROM content files in parallel.")
+    parser.add_argument("source", help="Directory with images or a glob pattern (e.g. 'rtl/**/*.png')")
+    parser.add_argument("--format", choices=FORMATS, default="dat",
+                        help="dat: original size with header (img2dat), data: 64x64 without header (img2dat_new)")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="Resize images first")
+    parser.add_argument("--manifest", help=f"Manifest file (default: {MANIFEST_NAME} in the source directory)")
+    parser.add_argument("-j", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--force", action="store_true", help="Convert all images, even if up to date")
+    args = parser.parse_args(argv)
+
+    params = dict(FORMATS[args.format])
+    if args.size:
+        params["size"] = list(args.size)
+    # Any change of the converter itself invalidates all outputs
+    params["converter"] = file_digest(CONVERTER_SOURCE)
+
+    images = find_images(args.source)
+    if not images:
+        print(f"No images found in {args.source}")
+        sys.exit(1)
+
+    manifest_dir = args.source if os.path.isdir(args.source) else os.getcwd()
+    manifest_path = args.manifest or os.path.join(manifest_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    pending = {}
+    for image_file in images:
+        output_file = output_path(image_file, params["extension"])
+        # Keyed by the output, so both formats of one image can be kept current
+        key = os.path.relpath(os.path.abspath(output_file), os.path.dirname(os.path.abspath(manifest_path)))
+        source_hash = file_digest(image_file)
+        if args.force or not is_current(manifest.get(key), source_hash, params, output_file):
+            pending[key] = (image_file, output_file, source_hash)
+
+    failed = []
+    if pending:
+        try:
+            with ProcessPoolExecutor(max_workers=max(1, args.j)) as pool:
+                futures = {key: pool.submit(convert, image_file, output_file, params)
+                           for key, (image_file, output_file, _) in pending.items()}
+                for key, future in futures.items():
+                    image_file, output_file, source_hash = pending[key]
+                    try:
+                        output_hash = future.result()
+                    except Exception as e:
+                        failed.append(image_file)
+                        manifest.pop(key, None)
+                        print(f"Error: {image_file} could not be converted: {e}")
+                        continue
+                    manifest[key] = {"source_hash": source_hash, "params": params, "output_hash": output_hash}
+                    print(f"{image_file} -> {output_file}")
+        finally:
+            # Completed conversions are kept even if the batch is interrupted
+            write_text_atomic(manifest_path, json.dumps(manifest, indent=2, sort_keys=True))
+
+    print(f"Converted {len(pending) - len(failed)} of {len(images)} images, {len(images) - len(pending)} up to date.")
+    if failed:
+        print(f"{len(failed)} images failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
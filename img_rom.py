@@ -0,0 +1,67 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Shared image to ROM content conversion used by img2dat and img2dat_new scripts.
+# Every pixel becomes one 12-bit RGB444 word written as three hex digits per line.
+import re
+import numpy as np
+from PIL import Image
+
+BITS_PER_CHANNEL = 4
+
+HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+NIBBLE_SHIFTS = np.array([8, 4, 0], dtype=np.uint16)
+
+
+def rgb444_words(array):
+    """
+    Convert an image array ([height x width] or [height x width x channels])
+    into a [height x width] array of 12-bit RGB444 words, keeping the 4 most
+    significant bits of each color channel.
+    """
+    array = np.asarray(array)
+    if array.ndim > 2 and array.shape[2] >= 3:
+        r, g, b = array[:, :, 0], array[:, :, 1], array[:, :, 2]
+    else:
+        # black & white image (with an optional alpha channel)
+        r = g = b = array if array.ndim == 2 else array[:, :, 0]
+
+    def high_nibble(channel):
+        return channel.astype(np.uint16) >> (8 - BITS_PER_CHANNEL)
+
+    return (high_nibble(r) << 8) | (high_nibble(g) << 4) | high_nibble(b)
+
+
+def rom_text(array):
+    """Format the whole image as ROM content: one 3-digit hex word per line."""
+    words = rgb444_words(array).reshape(-1)
+    chars = np.empty((words.size, 4), dtype=np.uint8)
+    chars[:, :3] = HEX_DIGITS[(words[:, None] >> NIBBLE_SHIFTS) & 0xF]
+    chars[:, 3] = ord("\n")
+    return chars.tobytes().decode("ascii")
+
+
+def output_path(image_file, extension):
+    """Return the ROM file name for an image: same path, 'extension' instead of the image one."""
+    return re.sub(r"\.[a-zA-Z0-9]*$", extension, image_file)
+
+
+def convert_image(image_file, output_file, size=None, resample="LANCZOS", header=True):
+    """
+    Convert an image file into a ROM content file. If 'size' (width, height) is
+    given, the image is resized first using the given PIL 'resample' filter.
+    With 'header' the file starts with comments describing the image.
+    """
+    image = Image.open(image_file)
+    if size:
+        image = image.resize(tuple(size), getattr(Image.Resampling, resample))
+
+    # the array shape is [height x width x channels]
+    array = np.asarray(image)
+
+    with open(output_file, "w") as f:
+        if header:
+            f.write("// image rom content of: " + str(image_file) + "\n")
+            f.write("// WIDTH = " + str(image.width) + "\n")
+            f.write("// HEIGHT = " + str(image.height) + "\n")
+        f.write(rom_text(array))
@@ -0,0 +1,166 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Implementation strategy exploration used by generate_bitstream script (-x flag).
+# Starting from one synthesized checkpoint, several implementation runs with
+# different placer/router directives are run in parallel Vivado batch processes
+# (see impl_explore.tcl). The number of concurrent runs is limited by the CPU
+# cores and memory of the machine. The WNS/TNS of every run is parsed from its
+# timing summary and only the bitstream of the best run is kept.
+# ------------------------------------------------------------------------------
+import os
+import math
+import glob
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from checkpoint_cache import checkpoint_dir
+
+EXPLORE_TCL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "impl_explore.tcl")
+EXPLORE_DIR_NAME = "explore"
+SUMMARY_FILE = "impl_explore.txt"
+
+THREADS_PER_RUN = 2
+MEMORY_PER_RUN_GB = 4   # peak memory of one implementation run of a mid-size Artix-7 design
+
+# Timing of a run without timed paths (no clocks), ranked below every timed run
+NO_TIMING = (float("-inf"), float("-inf"))
+
+# (place_design directive, route_design directive), the most promising first
+STRATEGIES = [
+    ("Default",                "Default"),
+    ("Explore",                "Explore"),
+    ("ExtraNetDelay_high",     "Explore"),
+    ("ExtraPostPlacementOpt",  "Explore"),
+    ("AltSpreadLogic_high",    "Explore"),
+    ("EarlyBlockPlacement",    "Explore"),
+    ("WLDrivenBlockPlacement", "Explore"),
+    ("ExtraTimingOpt",         "NoTimingRelaxation"),
+    ("SpreadLogic_high",       "AggressiveExplore"),
+    ("Explore",                "AggressiveExplore"),
+]
+
+
+def total_memory_gb():
+    """Physical memory of the machine in GB, or None if it can't be determined."""
+    try:
+        if os.name == "nt":
+            import ctypes
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MemoryStatus()
+            status.dwLength = ctypes.sizeof(MemoryStatus)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys / 2**30
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_jobs(runs):
+    """Number of runs that fit the CPU cores and memory at once."""
+    jobs = min(runs, max(1, (os.cpu_count() or 1) // THREADS_PER_RUN))
+    memory = total_memory_gb()
+    if memory:
+        jobs = min(jobs, max(1, int(memory // MEMORY_PER_RUN_GB)))
+    return jobs
+
+
+def find_synth_checkpoint(root_dir, build_dir, top_module):
+    """Synthesized checkpoint of the current build, or the cached reference of the last one."""
+    for path in [*glob.glob(os.path.join(build_dir, "*.runs", "synth_1", f"{top_module}.dcp")),
+                 os.path.join(checkpoint_dir(root_dir), "post_synth.dcp")]:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def parse_timing_summary(report_file):
+    """Return (WNS, TNS) from the Design Timing Summary of report_timing_summary, or None."""
+    try:
+        with open(report_file, "r", errors="replace") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    for i, line in enumerate(lines):
+        if "WNS(ns)" in line and "TNS(ns)" in line:
+            # Header, dashed line, values
+            for values in lines[i + 2:i + 4]:
+                fields = values.split()
+                try:
+                    return float(fields[0]), float(fields[1])
+                except (IndexError, ValueError):
+                    continue
+    return None
+
+
+def format_slack(value, width=0):
+    """Slack in ns for the logs and the summary, NA for a run without timing."""
+    return f"{'NA' if math.isinf(value) else f'{value:.3f}':>{width}}"
+
+
+def run_strategy(vivado_executable, run_dir, synth_dcp, strategy, bit_name):
+    """
+    Run one implementation in 'run_dir'. Returns (WNS, TNS), NO_TIMING if the
+    design has no timed paths, or None if it failed.
+    """
+    place_directive, route_directive = strategy
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+
+    command = (f'"{vivado_executable}" -mode batch -nojournal -log vivado.log -source "{EXPLORE_TCL}" '
+               f'-tclargs "{synth_dcp}" {place_directive} {route_directive} {bit_name} {THREADS_PER_RUN}')
+    subprocess.run(command, shell=True, cwd=run_dir, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+    if not os.path.isfile(os.path.join(run_dir, bit_name)):
+        return None
+    return parse_timing_summary(os.path.join(run_dir, "timing_summary.rpt")) or NO_TIMING
+
+
+def explore(vivado_executable, synth_dcp, build_dir, results_dir, bit_name, runs, jobs=None, log=print):
+    """
+    Run 'runs' strategies in parallel and copy the bitstream with the best timing
+    (highest WNS, then highest TNS) to 'results_dir'. Returns the best run name or None.
+    """
+    strategies = {f"{place}_{route}": (place, route) for place, route in STRATEGIES[:runs]}
+    jobs = jobs or default_jobs(len(strategies))
+    explore_dir = os.path.join(build_dir, EXPLORE_DIR_NAME)
+    log(f"Running {len(strategies)} implementation strategies, {jobs} at a time")
+
+    timing = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_strategy, vivado_executable, os.path.join(explore_dir, name),
+                               synth_dcp, strategy, bit_name): name
+                   for name, strategy in strategies.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            timing[name] = future.result()
+            if timing[name] is None:
+                log(f"{name}: failed, see {os.path.join(explore_dir, name, 'vivado.log')}")
+            else:
+                log(f"{name}: WNS {format_slack(timing[name][0])} ns, TNS {format_slack(timing[name][1])} ns")
+
+    finished = {name: result for name, result in timing.items() if result is not None}
+    if not finished:
+        return None
+    best = max(finished, key=lambda name: finished[name])
+
+    os.makedirs(results_dir, exist_ok=True)
+    shutil.copy(os.path.join(explore_dir, best, bit_name), results_dir)
+    with open(os.path.join(results_dir, SUMMARY_FILE), "w") as f:
+        f.write(f"{'strategy':<45} {'WNS(ns)':>9} {'TNS(ns)':>10}\n")
+        for name in sorted(strategies, key=lambda name: finished.get(name, (float("-inf"),)), reverse=True):
+            if name in finished:
+                f.write(f"{name:<45} {format_slack(finished[name][0], 9)} {format_slack(finished[name][1], 10)}"
+                        f"{'  <- best' if name == best else ''}\n")
+            else:
+                f.write(f"{name:<45} {'failed':>9}\n")
+    return best
@@ -0,0 +1,41 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# One implementation run of the strategy exploration started by
+# generate_bitstream script (-x flag). Implements a synthesized checkpoint with
+# the given placer/router directives and writes the timing summary and bitstream
+# into the current directory.
+#
+# Usage: vivado -mode batch -source impl_explore.tcl -tclargs <synth_dcp> <place_directive> <route_directive> <bit_file> <threads>
+
+lassign $argv synth_dcp place_directive route_directive bit_file threads
+
+set_param general.maxThreads $threads
+open_checkpoint $synth_dcp
+
+# Worst setup slack, or NA when there are no timed paths (no clocks, unconstrained design)
+proc worst_slack {} {
+    set paths [get_timing_paths -max_paths 1 -nworst 1 -setup]
+    if {[llength $paths] == 0} {
+        return NA
+    }
+    set slack [get_property SLACK $paths]
+    return [expr {$slack eq "" ? "NA" : $slack}]
+}
+
+opt_design -directive Explore
+place_design -directive $place_directive
+set slack [worst_slack]
+puts "Post-place WNS: $slack"
+if {$slack ne "NA" && $slack < 0} {
+    phys_opt_design -directive AggressiveExplore
+}
+route_design -directive $route_directive
+set slack [worst_slack]
+puts "Post-route WNS: $slack"
+if {$slack ne "NA" && $slack < 0} {
+    phys_opt_design -directive AggressiveExplore
+}
+
+report_timing_summary -file timing_summary.rpt
+write_bitstream -force $bit_file
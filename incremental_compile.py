@@ -0,0 +1,125 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Incremental compilation of simulation sources used by run_simulation script
+# when executed with -inc flag. Every source is compiled once with xvlog/xvhdl
+# into a persistent library in the toolchain cache. The hash of each file (and of
+# the files it `includes) is kept, so only changed files and the files depending
+# on their packages/interfaces are compiled again. Shared sources go to the 'work'
+# library; files from the test directory go to a per-test '<test>_lib' library,
+# so test-local helper modules of different tests don't clash.
+# ------------------------------------------------------------------------------
+import os
+import json
+import hashlib
+from hdl_deps import VHDL_EXTS, DependencyGraph, include_closure
+from toolchain_cache import cache_dir, file_digest, file_lock, write_text_atomic
+
+LIB_DIR_NAME = "xsim_lib"
+STATE_FILE = "compile_state.json"
+LOCK_FILE = "compile.lock"
+SHARED_LIB = "work"
+
+
+def library_dir(root_dir):
+    """Directory xvlog/xvhdl run in; libraries end up in its xsim.dir."""
+    return cache_dir(root_dir, LIB_DIR_NAME)
+
+
+def test_library(test_name):
+    return f"{test_name}_lib"
+
+
+def _tool_path(path):
+    return os.path.abspath(path).replace("\\", "/")
+
+
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _fingerprint(path, search_dirs):
+    """Hash of a source file together with everything it `includes."""
+    digest = hashlib.sha256(file_digest(path).encode())
+    for inc in include_closure([path], search_dirs):
+        digest.update(inc.encode())
+        digest.update(file_digest(inc).encode())
+    return digest.hexdigest()
+
+
+def _compile_command(lib, ext, files, include_dirs):
+    if ext in VHDL_EXTS:
+        tool = f"xvhdl -work {lib}"
+    else:
+        tool = f"xvlog {'-sv ' if ext == '.sv' else ''}-work {lib} -L {SHARED_LIB}"
+        tool += "".join(f" -i {_tool_path(d)}" for d in include_dirs)
+    return tool + " " + " ".join(_tool_path(f) for f in files)
+
+
+def compile_sources(root_dir, test_name, test_dir, sources, run_tool):
+    """
+    Bring the libraries up to date for 'sources' (as listed in the test .prj).
+    'run_tool(command, cwd)' runs an xvlog/xvhdl command line and returns True
+    on success. Returns the path of an xsim init file mapping the libraries,
+    to pass to xelab with -initfile, or None if compilation failed.
+    """
+    lib_dir = library_dir(root_dir)
+    state_path = os.path.join(lib_dir, STATE_FILE)
+    test_dir = os.path.abspath(test_dir)
+
+    def library_of(path):
+        return test_library(test_name) if os.path.dirname(os.path.abspath(path)) == test_dir else SHARED_LIB
+
+    graph = DependencyGraph(sources)
+    order = graph.compile_order()
+
+    # Concurrent tests share the library, only one of them may compile at a time
+    with file_lock(os.path.join(lib_dir, LOCK_FILE)):
+        state = _load_state(state_path)
+
+        # A file is stale when it changed, or when a package/interface it was
+        # compiled against changed (possibly by another test's compile run)
+        stale, entries = [], {}
+        for path in order:
+            deps = {dep: entries[dep]["signature"] for dep in graph.compile_time_deps(path) if dep in entries}
+            file_hash = _fingerprint(path, graph.search_dirs)
+            # The signature also covers the dependencies, so changes propagate transitively
+            signature = hashlib.sha256(json.dumps([file_hash, deps], sort_keys=True).encode()).hexdigest()
+            entries[path] = {"hash": file_hash, "deps": deps, "signature": signature}
+            if state.get(f"{library_of(path)}:{path}") != entries[path]:
+                stale.append(path)
+
+        # Consecutive files of the same library and language are compiled together
+        batches = []
+        for path in stale:
+            batch_id = (library_of(path), os.path.splitext(path)[1].lower())
+            if batches and batches[-1][0] == batch_id:
+                batches[-1][1].append(path)
+            else:
+                batches.append((batch_id, [path]))
+
+        ok = True
+        for (lib, ext), files in batches:
+            if not run_tool(_compile_command(lib, ext, files, graph.search_dirs), lib_dir):
+                for path in files:
+                    state.pop(f"{lib}:{path}", None)
+                ok = False
+                break
+            for path in files:
+                state[f"{lib}:{path}"] = entries[path]
+
+        write_text_atomic(state_path, json.dumps(state, indent=2, sort_keys=True))
+
+    if not ok:
+        return None
+
+    init_file = os.path.join(lib_dir, f"{test_name}.ini")
+    libraries = [SHARED_LIB, test_library(test_name)]
+    write_text_atomic(init_file, "".join(f"{lib}={_tool_path(os.path.join(lib_dir, 'xsim.dir', lib))}\n"
+                                         for lib in libraries))
+    return init_file
@@ -0,0 +1,87 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Phase timing shared by the toolchain scripts. Scripts wrap their phases (file
+# discovery, prj/tcl generation, git clean, xelab, xsim, Vivado stages, log
+# scanning, ...) in span() blocks. When the VTC_TRACE environment variable is set
+# (e.g. VTC_TRACE=1), the spans are written as a Chrome trace JSON (open it in
+# chrome://tracing or ui.perfetto.dev) and a summary table is printed at the end.
+# Child processes inherit the variable; their traces are merged into the parent.
+# ------------------------------------------------------------------------------
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+TRACE_ENV = "VTC_TRACE"
+
+_events = []
+_lock = threading.Lock()
+
+
+def enabled():
+    return os.environ.get(TRACE_ENV, "") not in ("", "0")
+
+
+def record(name, start, end, category="toolchain", **args):
+    """Add a span measured elsewhere ('start' and 'end' are time.time() values)."""
+    if not enabled():
+        return
+    event = {"name": name, "cat": category, "ph": "X",
+             "ts": int(start * 1e6), "dur": int((end - start) * 1e6),
+             "pid": os.getpid(), "tid": threading.get_ident() % 100000, "args": args}
+    with _lock:
+        _events.append(event)
+
+
+@contextmanager
+def span(name, category="toolchain", **args):
+    """Time the enclosed block as one span."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(name, start, time.time(), category, **args)
+
+
+def merge(trace_file):
+    """Add the spans of a child process trace, if it wrote one."""
+    if not enabled():
+        return
+    try:
+        with open(trace_file, "r", encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+    except (OSError, ValueError, KeyError):
+        return
+    with _lock:
+        _events.extend(events)
+
+
+def print_summary(title):
+    """Print total and maximum time per span name, longest first."""
+    totals = {}
+    for event in _events:
+        count, total, longest = totals.get(event["name"], (0, 0, 0))
+        totals[event["name"]] = (count + 1, total + event["dur"] / 1e6, max(longest, event["dur"] / 1e6))
+
+    name_width = max(len(name) for name in totals)
+    print(f"\n{title} phase timing")
+    print(f"{'phase':<{name_width}}  {'count':>5}  {'total':>9}  {'max':>9}")
+    for name, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"{name:<{name_width}}  {count:>5}  {total:>8.1f}s  {longest:>8.1f}s")
+
+
+def finish(trace_file, title, summary=True):
+    """Write the recorded spans to 'trace_file' and print the summary."""
+    if not enabled() or not _events:
+        return
+    os.makedirs(os.path.dirname(trace_file), exist_ok=True)
+    with _lock:
+        events = sorted(_events, key=lambda event: event["ts"])
+    with open(trace_file, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    if summary:
+        print_summary(title)
+        print(f"Trace saved to {trace_file}")
@@ -0,0 +1,88 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Helpers for running tool processes (xelab, xsim, vivado) with their output
+# streamed line by line, so it can be printed and checked while the tool runs
+# and the whole process tree can be stopped early (or after a timeout).
+# ------------------------------------------------------------------------------
+import os
+import signal
+import threading
+import subprocess
+
+
+def kill_process_tree(process):
+    """Kill 'process' together with all of its children (tools run via cmd.exe or a shell)."""
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        # Children may have started their own sessions (e.g. a nested stream_command)
+        for pid in [process.pid] + _descendants(process.pid):
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+    process.wait()
+
+
+def _descendants(pid):
+    """Return pids of all descendants of 'pid' (POSIX, from ps)."""
+    listing = subprocess.run(["ps", "-e", "-o", "pid=,ppid="], capture_output=True, text=True).stdout
+    children = {}
+    for line in listing.splitlines():
+        child, parent = (int(value) for value in line.split())
+        children.setdefault(parent, []).append(child)
+    found, pending = [], [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def stream_command(command, cwd, on_line, timeout=None):
+    """
+    Run 'command' and call on_line(line) for every output line as soon as it is
+    produced. If on_line returns False the process tree is killed.
+    Returns (returncode, stopped) where 'stopped' tells if the run was cut short.
+    If the command runs longer than 'timeout' seconds (even without printing
+    anything), the process tree is killed and TimeoutExpired is raised.
+    """
+    process = subprocess.Popen(command, cwd=cwd, shell=isinstance(command, str) and os.name != "nt",
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, errors="replace", bufsize=1,
+                               start_new_session=os.name != "nt")
+    timed_out = threading.Event()
+
+    def expire():
+        if process.poll() is None:
+            timed_out.set()
+            kill_process_tree(process)
+
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    stopped = False
+    try:
+        with process.stdout:
+            for line in process.stdout:
+                if on_line(line.rstrip("\r\n")) is False:
+                    stopped = True
+                    kill_process_tree(process)
+                    break
+        returncode = process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, timeout)
+    return returncode, stopped
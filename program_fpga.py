@@ -6,47 +6,56 @@
 
 import os
 import glob
+import argparse
 import subprocess
 import sys
 import colorama
+from vivado_session import VivadoSessionError, connect
+from phase_trace import finish as finish_trace, span
+from vtc_config import get_config
 
-ENV_FILE = ".env"
-ROOT_DIR = None
-VIVADO_DIR = None
 
-colorama.init(autoreset=True)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the bitstream from the results directory to the FPGA.")
+    parser.parse_args(argv)
 
-if os.path.exists(ENV_FILE):
-    with open(ENV_FILE, "r") as f:
-        for line in f:
-            if line.startswith("ROOT_DIR="):
-                ROOT_DIR = line.strip().split("=")[1].strip('"')
-            elif line.startswith("VIVADO_DIR="):
-                VIVADO_DIR = line.strip().split("=")[1].strip('"')
+    colorama.init(autoreset=True)
+    config = get_config("ROOT_DIR", "VIVADO_DIR")
+    ROOT_DIR = config["ROOT_DIR"]
+    VIVADO_DIR = config["VIVADO_DIR"]
 
-if not ROOT_DIR:
-    print(colorama.Fore.YELLOW + "ROOT_DIR is not set. Run env.py first to initialize it.")
-    sys.exit(1)
+    vivado_bin = os.path.join(VIVADO_DIR, "bin")
+    os.environ["PATH"] = vivado_bin + os.pathsep + os.environ["PATH"]
 
-if not VIVADO_DIR:
-    print(colorama.Fore.YELLOW + "VIVADO_DIR is not set. Run env.py first to initialize it.")
-    sys.exit(1)
+    bitstream_files = glob.glob(os.path.join(ROOT_DIR, "results", "*.bit"))
 
-vivado_bin = os.path.join(VIVADO_DIR, "bin")
-os.environ["PATH"] = vivado_bin + os.pathsep + os.environ["PATH"]
+    if not bitstream_files:
+        print(colorama.Fore.RED + "Error: No .bit file found in the results directory.")
+        sys.exit(1)
 
+    bitstream_file = bitstream_files[0] 
+    tcl_script = os.path.join(ROOT_DIR, "fpga", "scripts", "program_fpga.tcl")
 
-bitstream_files = glob.glob(os.path.join(ROOT_DIR, "results", "*.bit"))
+    # Use a running Vivado session (see vivado_session.py) to skip the tool startup
+    session = connect(ROOT_DIR)
 
-if not bitstream_files:
-    print(colorama.Fore.RED + "Error: No .bit file found in the results directory.")
-    sys.exit(1)
+    with span("vivado program", "vivado"):
+        if session:
+            print(colorama.Fore.CYAN + f"[INFO] Using running Vivado session (port {session.port}).")
+            try:
+                session.run("catch {disconnect_hw_server}\ncatch {close_hw_manager}")
+                print(session.source(tcl_script, os.getcwd(), [bitstream_file]), end="")
+            except VivadoSessionError as e:
+                print(str(e), end="")
+                print(colorama.Fore.RED + "Error: program_fpga.tcl failed in the Vivado session.")
+                sys.exit(1)
+        else:
+            command = f'{VIVADO_DIR}/vivado.bat -mode tcl -source "{tcl_script}" -tclargs "{bitstream_file}"'
+            subprocess.run(command, shell=True)
 
-bitstream_file = bitstream_files[0] 
-tcl_script = os.path.join(ROOT_DIR, "fpga", "scripts", "program_fpga.tcl")
+    print(colorama.Fore.GREEN + f"Bitstream {bitstream_file} programmed successfully.")
+    finish_trace(os.path.join(ROOT_DIR, "results", "trace_program_fpga.json"), "program_fpga")
 
 
-command = f'{VIVADO_DIR}/vivado.bat -mode tcl -source "{tcl_script}" -tclargs "{bitstream_file}"'
-subprocess.run(command, shell=True)
-
-print(colorama.Fore.GREEN + f"Bitstream {bitstream_file} programmed successfully.")
+if __name__ == "__main__":
+    main()
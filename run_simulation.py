@@ -15,158 +15,627 @@ import glob
 import argparse
 import colorama
 import time
+import shutil
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from add_files_to_prj import generate_prj_file
+from elab_cache import elab_key, prj_source_files, restore_snapshot, store_snapshot, tool_id
+from incremental_compile import compile_sources, library_dir, test_library
+from file_index import get_index
+from file_watch import watch as watch_files
+from hdl_deps import include_closure
+from process_utils import kill_process_tree, stream_command
+from phase_trace import finish as finish_trace, merge as merge_trace, span
+from sim_history import expected_durations, load_history, record_run, sim_timeout
+from sim_profiles import DEFAULT_PROFILE, PROFILES, snapshot_name, test_settings, xelab_options
+from vtc_config import get_config
+from sim_results import (RESULT_FILE, FAILING_SEVERITIES, LogClassifier, TestResult, load_json_report,
+                         merge_reports, shard_tests, write_json_report, write_junit_report)
 
-ENV_FILE = ".env"
 ROOT_DIR = None
-VIVADO_SETUP = None
-
-MAX_SIM_TIME = 60 # seconds 
-
-colorama.init(autoreset=True)
-
-if os.path.exists(ENV_FILE):
-    with open(ENV_FILE, "r") as f:
-        for line in f:
-            key, value = line.strip().split("=")
-            value = value.strip('"')
-            if key == "ROOT_DIR":
-                ROOT_DIR = value
-            elif key == "VIVADO_SETUP":
-                VIVADO_SETUP = value
-
-if not ROOT_DIR:
-    print(colorama.Fore.YELLOW + "ROOT_DIR is not set. Run env.py first to initialize it.")
-    sys.exit(1)
-
-if not VIVADO_SETUP:
-    print(colorama.Fore.YELLOW + "VIVADO_SETUP is not set in .env. Run env.py first to initialize it.")
-    sys.exit(1)
-
-SIM_DIR = os.path.join(ROOT_DIR, "sim")
-BUILD_DIR = os.path.join(SIM_DIR, "build")
-
-SETUP_CMD = f'call "{VIVADO_SETUP}" && '
+SIM_DIR = None
+BUILD_DIR = None
+RESULTS_DIR = None
+SETUP_CMD = None
+TOOL_ID = None
+
+NON_TEST_DIRS = ["build", "common"]
+TRACE_FILE = "trace.json"
+
+# Failed batch tests are rerun with debug visibility, logging the waves below WAVE_SCOPE
+WAVE_SCOPE = "/"
+WAVE_TCL = "log_waves.tcl"
+
+# Watch mode: directories (relative to the project root) and files that trigger a rerun
+WATCH_DIRS = ["rtl", "sim", os.path.join("fpga", "rtl")]
+WATCH_EXTS = {".sv", ".svh", ".v", ".vh", ".vhd", ".vhdl", ".prj"}
+
+def configure(config):
+    """Set the project paths used by this module from the .env configuration."""
+    global ROOT_DIR, SIM_DIR, BUILD_DIR, RESULTS_DIR, SETUP_CMD, TOOL_ID
+    ROOT_DIR = config["ROOT_DIR"]
+    SIM_DIR = os.path.join(ROOT_DIR, "sim")
+    BUILD_DIR = os.path.join(SIM_DIR, "build")
+    RESULTS_DIR = os.path.join(ROOT_DIR, "results")
+    SETUP_CMD = f'call "{config.get("VIVADO_SETUP")}" && '
+    TOOL_ID = tool_id(config.get("VIVADO_SETUP"))
+
+def discover_tests():
+    """Return sorted names of all test directories in the sim directory."""
+    return sorted(name for name in os.listdir(SIM_DIR) if os.path.isdir(os.path.join(SIM_DIR, name))
+                  and name not in NON_TEST_DIRS)
 
 def list_available_tests():
     """List all available tests in the sim directory, excluding non-test folders."""
-    tests = [name for name in os.listdir(SIM_DIR) if os.path.isdir(os.path.join(SIM_DIR, name))
-             and name not in ["build", "common"]]
+    tests = discover_tests()
     if tests:
         print("\n".join(tests))
     else:
         print("No tests found.")
     sys.exit(0)
 
-def execute_test(test_name, show_gui, update_prj):
-    """Run the specified test with or without GUI."""
-    subprocess.run(["git", "clean", "-fXd", "."], cwd=SIM_DIR)
+def print_tool_line(line, severity):
+    """Print a line of tool output, colored by its severity."""
+    line = line.strip()
+    if severity in FAILING_SEVERITIES:
+        print(colorama.Fore.RED + line + colorama.Style.RESET_ALL, flush=True)
+    elif severity:
+        print(colorama.Fore.YELLOW + line + colorama.Style.RESET_ALL, flush=True)
+    else:
+        print(line, flush=True)
+
+def elaborate(test_name, xelab_opts, build_dir, classifier):
+    """Run xelab in 'build_dir', streaming its output. Returns True on success."""
+    def on_elab_line(line):
+        print_tool_line(line, classifier.feed(line))
+
+    with span("xelab", "sim", test=test_name):
+        returncode, _ = stream_command(f'cmd.exe /c "{SETUP_CMD} xelab {xelab_opts}"', build_dir, on_elab_line)
+
+    if returncode != 0:
+        print(colorama.Fore.RED + f"[{test_name}] FAILED (xelab error)" + colorama.Style.RESET_ALL)
+        return False
+    return True
+
+def run_compile_tool(command, cwd, classifier):
+    """Run an xvlog/xvhdl command line, streaming its output. Returns True on success."""
+    def on_compile_line(line):
+        print_tool_line(line, classifier.feed(line))
 
-    if not os.path.exists(BUILD_DIR):
-        os.makedirs(BUILD_DIR, exist_ok=True)
+    returncode, _ = stream_command(f'cmd.exe /c "{SETUP_CMD} {command}"', cwd, on_compile_line)
+    return returncode == 0
+
+def compile_test(test_name, classifier):
+    """Incrementally compile the sources of a test. Returns the xsim init file or None."""
+    test_path = os.path.join(SIM_DIR, test_name)
+    sources = prj_source_files(os.path.join(test_path, f"{test_name}.prj"))
+    with span("compile", "sim", test=test_name):
+        return compile_sources(ROOT_DIR, test_name, test_path, sources,
+                               lambda command, cwd: run_compile_tool(command, cwd, classifier))
+
+def build_snapshot(test_name, snapshot, xelab_opts, project_file, wcfg_file, build_dir, classifier, incremental):
+    """
+    Restore the snapshot from the elaboration cache, or compile (with 'incremental')
+    and elaborate it. Returns (success, cached).
+    """
+    # Skip xelab when nothing in the .prj closure, wcfg or options changed
+    with span("elab cache lookup", "sim", test=test_name):
+        elab_inputs_key = elab_key(project_file, xelab_opts, [wcfg_file] if wcfg_file else [], get_index(ROOT_DIR),
+                                   TOOL_ID)
+        cache_hit = restore_snapshot(ROOT_DIR, snapshot, elab_inputs_key, build_dir)
+    if cache_hit:
+        print(colorama.Fore.CYAN + f"[{test_name}] Sources unchanged, reusing cached snapshot {snapshot}")
+        return True, True
+
+    elab_ok = (not incremental or compile_test(test_name, classifier)) and \
+              elaborate(test_name, xelab_opts, build_dir, classifier)
+    if elab_ok:
+        with span("elab cache store", "sim", test=test_name):
+            store_snapshot(ROOT_DIR, snapshot, elab_inputs_key, build_dir)
+    return elab_ok, False
+
+def rerun_with_waves(test_name, snapshot, xelab_opts, project_file, wcfg_file, build_dir, wave_scope, timeout):
+    """
+    Rerun a failed test from a snapshot with debug visibility, logging the waves
+    below 'wave_scope' into <test>.wdb in its build directory. Returns the .wdb path or None.
+    """
+    wave_file = os.path.join(build_dir, f"{test_name}.wdb")
+    print(colorama.Fore.CYAN + f"[{test_name}] Rerunning with waveform logging of {wave_scope}")
+
+    # The sources were already compiled by the failed run
+    elab_ok, _ = build_snapshot(test_name, snapshot, xelab_opts, project_file, wcfg_file,
+                                build_dir, LogClassifier(), False)
+    if not elab_ok:
+        return None
+
+    with open(os.path.join(build_dir, WAVE_TCL), "w") as f:
+        f.write(f"log_wave -r {wave_scope}\nrun all\nquit\n")
+    with span("xsim waves", "sim", test=test_name):
+        try:
+            stream_command(f'cmd.exe /c "{SETUP_CMD} xsim {snapshot} -wdb {wave_file} -tclbatch {WAVE_TCL} '
+                           f'-log xsim_waves.log"', build_dir, lambda line: None, timeout)
+        except subprocess.TimeoutExpired:
+            pass
+    return wave_file if os.path.isfile(wave_file) else None
+
+def execute_test(test_name, show_gui, update_prj, fail_fast=False, incremental=False, timeout=None,
+                 wave_scope=WAVE_SCOPE, profile=None):
+    """
+    Run the specified test with or without GUI. In batch mode returns the test
+    result record, which is also saved to result.json in the test build directory
+    and added to the runtime history.
+    Batch runs are elaborated without debug visibility and log no waves; a failed
+    simulation is rerun with the waves below 'wave_scope' logged (None disables it),
+    unless it was killed by the timeout.
+    With 'fail_fast' the simulation is killed at the first fatal/error message.
+    With 'incremental' sources are compiled into persistent libraries and only
+    changed files are recompiled, instead of passing the whole .prj to xelab.
+    A batch simulation running longer than 'timeout' seconds is killed.
+    'profile' selects the xelab options (see sim_profiles) of a test that doesn't
+    set its own one in the test directory.
+    """
+    # Each test gets its own build directory, so tests can run side by side
+    build_dir = os.path.join(BUILD_DIR, test_name)
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir, exist_ok=True)
 
     test_path = os.path.join(SIM_DIR, test_name)
     project_file = os.path.join(test_path, f"{test_name}.prj")
     
-    if update_prj: generate_prj_file(test_name, SIM_DIR)
+    if update_prj:
+        with span("prj generation", "sim", test=test_name):
+            generate_prj_file(test_name, SIM_DIR)
 
     compile_glbl = "work.glbl" if "glbl.v" in open(project_file).read() else ""
 
-    xelab_opts = f"work.{test_name}_tb {compile_glbl} -snapshot {test_name}_tb -prj {project_file} -timescale 1ns/1ps -L unisims_ver"
+    try:
+        test_profile, libraries, extra_opts = test_settings(test_path)
+    except ValueError as e:
+        print(colorama.Fore.RED + f"[ERROR] {e}")
+        sys.exit(1)
+    profile = test_profile or profile or DEFAULT_PROFILE
+
+    def profile_options(debug=None):
+        """Snapshot name and xelab options of the test's profile."""
+        snapshot = snapshot_name(test_name, profile, debug)
+        opts = xelab_options(profile, libraries, extra_opts, debug, os.path.join(RESULTS_DIR, "coverage"), test_name)
+        return snapshot, f"{design_opts} -snapshot {snapshot} {opts}"
+
+    if incremental:
+        init_file = os.path.join(library_dir(ROOT_DIR), f"{test_name}.ini")
+        design_opts = f"{test_library(test_name)}.{test_name}_tb {compile_glbl} -initfile {init_file} -L work"
+    else:
+        design_opts = f"work.{test_name}_tb {compile_glbl} -prj {project_file}"
+    snapshot, xelab_opts = profile_options("typical" if show_gui else None)
+    if profile != DEFAULT_PROFILE:
+        print(colorama.Fore.CYAN + f"[{test_name}] Using the {profile} xelab profile")
 
     wcfg_files = glob.glob(os.path.join(test_path, "*.wcfg"))
     wcfg_file = wcfg_files[0] if wcfg_files else None
 
+    sim_cmd_tcl = os.path.join(ROOT_DIR, "tools", "sim_cmd.tcl").replace("\\", "/")
+
+    result = TestResult(test_name)
+    classifier = LogClassifier()
+
+    def finish(status):
+        result.status = status
+        result.counts = classifier.counts
+        result.first_failure = classifier.first_failure
+        result.save(os.path.join(build_dir, RESULT_FILE))
+        record_run(ROOT_DIR, result)
+        return result
+
+    start_time = time.time()
+    elab_ok, result.elab_cached = build_snapshot(test_name, snapshot, xelab_opts, project_file, wcfg_file,
+                                                 build_dir, classifier, incremental)
+    if not result.elab_cached:
+        result.elab_time = time.time() - start_time
+    if not elab_ok:
+        if classifier.first_failure is None:
+            classifier.first_failure = "compilation error"
+        return finish("failed")
 
     if show_gui:
 
         if wcfg_file:
-            subprocess.run(f'cmd.exe /c "{SETUP_CMD} xelab {xelab_opts} -debug typical"', cwd=BUILD_DIR)
-            subprocess.run(f'cmd.exe /c "{SETUP_CMD} xsim {test_name}_tb -gui -view {wcfg_file} -t {os.path.join(ROOT_DIR, "tools", "sim_cmd.tcl").replace("\\", "/")}"', cwd=BUILD_DIR)
+            subprocess.run(f'cmd.exe /c "{SETUP_CMD} xsim {snapshot} -gui -view {wcfg_file} -t {sim_cmd_tcl}"', cwd=build_dir)
         else:
-            subprocess.run(f'cmd.exe /c "{SETUP_CMD} xelab {xelab_opts} -debug typical"', cwd=BUILD_DIR)
-            subprocess.run(f'cmd.exe /c "{SETUP_CMD} xsim {test_name}_tb -gui -t {os.path.join(ROOT_DIR, "tools", "sim_cmd.tcl").replace("\\", "/")}"', cwd=BUILD_DIR)    
-    
-    else:
-        process = subprocess.run(f'cmd.exe /c "{SETUP_CMD} xelab {xelab_opts} -standalone -runall"',
-                                 cwd=BUILD_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        if process.returncode != 0:
-            print(colorama.Fore.RED + f"[{test_name}] FAILED (xelab error)" + colorama.Style.RESET_ALL)
-            for line in process.stdout.splitlines():
-                if line.strip().startswith("ERROR"):
-                    print(colorama.Fore.RED + line.strip() + colorama.Style.RESET_ALL)
-                else:
-                    print(line.strip())
-            return
-        else:
-            for line in process.stdout.splitlines():
-                if line.strip().startswith("WARNING"):
-                    print(colorama.Fore.YELLOW + line.strip() + colorama.Style.RESET_ALL)
-                else:
-                    print(line.strip())
+            subprocess.run(f'cmd.exe /c "{SETUP_CMD} xsim {snapshot} -gui -t {sim_cmd_tcl}"', cwd=build_dir)
+        return None
 
-        log_file = os.path.join(BUILD_DIR, "xsim.log")
+    else:
+        def on_sim_line(line):
+            """Print and classify each simulator line as it arrives."""
+            severity = classifier.feed(line)
+            print_tool_line(line, severity)
+            # Returning False stops the simulation
+            return not (fail_fast and severity in FAILING_SEVERITIES)
 
         start_time = time.time()
-        while not os.path.exists(log_file):
-            if time.time() - start_time > MAX_SIM_TIME:
-                print(colorama.Fore.RED + f"[{test_name}] FAILED (xsim.log not found after {MAX_SIM_TIME} seconds)")
-                return
-            time.sleep(1)
+        with span("xsim", "sim", test=test_name):
+            try:
+                returncode, stopped = stream_command(f'cmd.exe /c "{SETUP_CMD} xsim {snapshot} -R"', build_dir,
+                                                     on_sim_line, timeout)
+            except subprocess.TimeoutExpired:
+                result.timed_out = True
+        result.sim_time = time.time() - start_time
+
+        if result.timed_out:
+            classifier.first_failure = f"xsim killed after the {timeout:.0f} s timeout"
+            print(colorama.Fore.RED + f"[{test_name}] FAILED (timeout)")
+        elif stopped:
+            print(colorama.Fore.RED + f"[{test_name}] FAILED (stopped at first error)")
+        elif classifier.failed:
+            print(colorama.Fore.RED + f"[{test_name}] FAILED ")
+        elif returncode != 0:
+            classifier.first_failure = f"xsim exited with code {returncode}"
+            print(colorama.Fore.RED + f"[{test_name}] FAILED ({classifier.first_failure})")
+        else:
+            print(colorama.Fore.GREEN + f"[{test_name}] PASSED ")
+            return finish("passed")
+
+        print(colorama.Fore.RED + ">> " + classifier.first_failure)
+        # A hung simulation would only hang again, for another full timeout
+        if wave_scope and result.timed_out:
+            print(colorama.Fore.YELLOW + f"[{test_name}] Timed out, not rerun with waveform logging")
+        elif wave_scope:
+            result.wave_file = rerun_with_waves(test_name, *profile_options("typical"), project_file, wcfg_file,
+                                                build_dir, wave_scope, timeout)
+            if result.wave_file:
+                print(colorama.Fore.CYAN + f"[{test_name}] Waveform saved to {result.wave_file}")
+        return finish("failed")
+
+
+def run_test_subprocess(test, child_args):
+    """Run a single test in a child process. Returns its result record and captured output."""
+    start_time = time.time()
+    with span(f"test {test}", "sim"):
+        process = subprocess.run([sys.executable, __file__, "-t", test] + child_args,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    merge_trace(os.path.join(BUILD_DIR, test, TRACE_FILE))
+
+    result_file = os.path.join(BUILD_DIR, test, RESULT_FILE)
+    if os.path.exists(result_file):
+        result = TestResult.load(result_file)
+    else:
+        # The child died before writing its record
+        last_lines = process.stdout.strip().splitlines()[-1:] or [f"exit code {process.returncode}"]
+        result = TestResult(test, status="error", sim_time=time.time() - start_time,
+                            first_failure=last_lines[0])
+    return result, process.stdout
+
+
+def print_summary(results, total_time):
+    """Print a combined pass/fail/duration table for a regression run."""
+    passed = sum(1 for r in results if r.passed)
+    name_width = max(len(r.name) for r in results)
+
+    print("\n" + "-" * (name_width + 40))
+    for r in sorted(results, key=lambda r: r.name):
+        status = colorama.Fore.GREEN + "PASSED" if r.passed else colorama.Fore.RED + r.status.upper()
+        elab = "cached" if r.elab_cached else f"{r.elab_time:6.1f} s"
+        print(f"{r.name:<{name_width}}  {status:<11}{colorama.Style.RESET_ALL}  elab {elab:>8}  sim {r.sim_time:7.1f} s")
+    print("-" * (name_width + 40))
+
+    color = colorama.Fore.GREEN if passed == len(results) else colorama.Fore.RED
+    print(color + f"{passed}/{len(results)} tests passed in {total_time:.1f} s")
+
+
+def write_reports(results, outputs, shard=None, selected=None):
+    """
+    Save results as JSON and JUnit XML in the results directory. 'selected' lists
+    the tests chosen by changed files, before sharding.
+    """
+    suffix = f"_shard{shard[0]}of{shard[1]}" if shard else ""
+    json_report = os.path.join(RESULTS_DIR, f"sim_results{suffix}.json")
+    junit_report = os.path.join(RESULTS_DIR, f"sim_results{suffix}.xml")
+    write_json_report(results, json_report, outputs, shard, selected)
+    write_junit_report(results, junit_report, outputs=outputs)
+    print(f"Results saved to {json_report} and {junit_report}")
+
+
+def changed_files(revision_range):
+    """Absolute paths of files changed in a git revision range (e.g. 'main...HEAD', or 'HEAD' for uncommitted changes)."""
+    process = subprocess.run(["git", "diff", "--name-only", "--relative", revision_range],
+                             cwd=ROOT_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        print(colorama.Fore.RED + f"Error: git diff {revision_range} failed: {process.stderr.strip()}")
+        sys.exit(1)
+    return [os.path.join(ROOT_DIR, line) for line in process.stdout.splitlines() if line]
 
-        with open(log_file, "r") as f:
-            log_output = f.read().lower()
 
-        failed_keywords = ["fatal", "error", "critical", "failed"]
+def select_tests(tests, changed):
+    """Return the tests whose source closure (or test directory) contains one of the 'changed' files."""
+    changed = {os.path.normpath(os.path.abspath(path)) for path in changed}
+    selected = []
+    for test in tests:
+        test_dir = os.path.join(SIM_DIR, test) + os.sep
+        if test_sources(test) & changed or any(path.startswith(test_dir) for path in changed):
+            selected.append(test)
+    return selected
+
+
+def child_arguments(fail_fast=False, incremental=False, timeout=None, wave_scope=WAVE_SCOPE, profile=None):
+    """Command line options of the child processes running single tests."""
+    child_args = (["-ff"] if fail_fast else []) + (["-inc"] if incremental else [])
+    if profile:
+        child_args += ["-profile", profile]
+    if timeout is not None:
+        child_args += ["-timeout", str(timeout)]
+    if not wave_scope:
+        child_args += ["-nw"]
+    elif wave_scope != WAVE_SCOPE:
+        child_args += ["-wscope", wave_scope]
+    return child_args
+
+
+def run_all(jobs=1, fail_fast=False, incremental=False, shard=None, timings=None, changed=None, timeout=None,
+            wave_scope=WAVE_SCOPE, profile=None):
+    """
+    Run all available tests in a pool of 'jobs' workers and summarize results.
+    Tests are started longest first, by their runtime history.
+    With 'shard' (index, count) only that part of the tests is run, balanced
+    by the test durations in the 'timings' report (e.g. an earlier sim_results.json).
+    The local runtime history differs between CI nodes, so it only orders the
+    tests inside a shard.
+    With 'changed' (list of files) only the tests built from these files are run.
+    A fixed 'timeout' replaces the per-test timeouts from the history.
+    Failed tests are rerun with the waves below 'wave_scope' logged (None disables it).
+    'profile' is used by the tests that don't set their own xelab profile.
+    """
+    with span("test discovery", "sim"):
+        all_tests = discover_tests()
+    tests = list(all_tests)
 
-        is_failed = any(keyword in log_output for keyword in failed_keywords)
+    if not tests:
+        print("No tests found.")
+        sys.exit(1)
 
-        if not is_failed:
-            print(colorama.Fore.GREEN + f"[{test_name}] PASSED ")
-        else:
-            print(colorama.Fore.RED + f"[{test_name}] FAILED ")
-            with open(log_file, "r") as f:
-                for line in f:
-                    if any(keyword in line.lower() for keyword in ["fatal", "error"]):
-                        print(colorama.Fore.RED + ">> " + line.strip())
+    selected = None
+    if changed is not None:
+        tests = selected = select_tests(tests, changed)
+        print(f"Tests affected by {len(changed)} changed files: {', '.join(tests) or 'none'}")
 
+    if shard:
+        durations = {r.name: r.duration for r in load_json_report(timings)[0]} if timings else {}
+        tests = shard_tests(tests, shard[0], shard[1], durations)
+        print(f"Shard {shard[0]}/{shard[1]}: {', '.join(tests) or 'no tests'}")
 
-def run_all():
-    """Run all available tests and summarize results."""
-    tests = [name for name in os.listdir(SIM_DIR) if os.path.isdir(os.path.join(SIM_DIR, name))
-             and name not in ["build", "common"]]
-    
     if not tests:
-        print("No tests found.")
+        write_reports([], {}, shard, selected)
+        sys.exit(0)
+
+    # Each test clears its own build directory, only those of removed tests are stale.
+    # Tests left out by sharding or changed-file selection keep their results and waves.
+    # Compiled libraries and snapshots live in the toolchain cache and are kept.
+    with span("clean", "sim"):
+        if os.path.isdir(BUILD_DIR):
+            for name in os.listdir(BUILD_DIR):
+                if name not in all_tests:
+                    shutil.rmtree(os.path.join(BUILD_DIR, name), ignore_errors=True)
+
+    # The slowest test must not be the last one to start
+    durations = expected_durations(load_history(ROOT_DIR))
+    known = [durations[t] for t in tests if t in durations]
+    default = sum(known) / len(known) if known else 0.0
+    tests.sort(key=lambda t: -durations.get(t, default))
+
+    child_args = child_arguments(fail_fast, incremental, timeout, wave_scope, profile)
+
+    # Compile the shared library before the tests start, so that concurrent
+    # elaborations never read a library that is being written
+    if incremental:
+        for test in tests:
+            print(f"Compiling {test} sources")
+            compile_test(test, LogClassifier())
+
+    print_lock = threading.Lock()
+    results, failed_outputs = [], {}
+    start_time = time.time()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(run_test_subprocess, test, child_args) for test in tests]
+        for future in as_completed(futures):
+            result, output = future.result()
+            results.append(result)
+            # Child output is captured and printed as one block, so it never interleaves
+            with print_lock:
+                if result.passed:
+                    print(f"Running {result.name}: " + colorama.Fore.GREEN + f"PASSED ({result.duration:.1f} s)")
+                else:
+                    failed_outputs[result.name] = output
+                    print(f"Running {result.name}: " + colorama.Fore.RED + f"FAILED ({result.duration:.1f} s)")
+                    print(output.rstrip())
+
+    print_summary(results, time.time() - start_time)
+    write_reports(results, failed_outputs, shard, selected)
+    finish_trace(os.path.join(RESULTS_DIR, "trace_run_simulation.json"), "run_simulation")
+
+    sys.exit(0 if all(r.passed for r in results) else 1)
+
+def test_sources(test_name):
+    """Absolute paths of all files a test is built from: its .prj, the listed sources and their includes."""
+    project_file = os.path.join(SIM_DIR, test_name, f"{test_name}.prj")
+    if not os.path.isfile(project_file):
+        return set()
+    # Deleted sources are kept, removing a file listed in the .prj breaks the test
+    sources = prj_source_files(project_file, include_missing=True)
+    existing = [path for path in sources if os.path.isfile(path)]
+    search_dirs = sorted({os.path.dirname(path) for path in existing})
+    return {os.path.normpath(path) for path in [project_file, *sources, *include_closure(existing, search_dirs)]}
+
+
+def watch(tests, child_args, update_prj=False):
+    """
+    Rerun the tests whose sources change, until interrupted. Changes are batched
+    per burst of saves, and a running test is cancelled (and queued again) when
+    a newer change to its sources arrives. With 'update_prj' the .prj files are
+    regenerated when a source file is added or removed, so new files get picked up.
+    """
+    changes = queue.Queue()
+
+    def watcher():
+        exclude = [BUILD_DIR]
+        for batch in watch_files([os.path.join(ROOT_DIR, d) for d in WATCH_DIRS], WATCH_EXTS, exclude):
+            changes.put(batch)
+
+    threading.Thread(target=watcher, daemon=True).start()
+    sources = {test: test_sources(test) for test in tests}
+    print(colorama.Fore.CYAN + f"[INFO] Watching {', '.join(WATCH_DIRS)} for {len(tests)} tests (Ctrl+C to stop)")
+
+    # .prj files written here -> (mtime, size), their watcher events are not user changes
+    written = {}
+
+    def file_state(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def affected_tests(changed):
+        changed = {os.path.normpath(path) for path in changed}
+        changed = {path for path in changed if path not in written or written[path] != file_state(path)}
+        known = set().union(*sources.values())
+        if update_prj and (changed - known):
+            for test in tests:
+                if generate_prj_file(test, SIM_DIR):
+                    project_file = os.path.normpath(os.path.join(SIM_DIR, test, f"{test}.prj"))
+                    written[project_file] = file_state(project_file)
+                new_sources = test_sources(test)
+                if new_sources != sources[test]:
+                    changed.add(os.path.join(SIM_DIR, test, f"{test}.prj"))
+                    sources[test] = new_sources
+        return [test for test in tests if sources[test] & changed]
+
+    pending = []
+    while True:
+        if not pending:
+            pending = affected_tests(changes.get())
+            continue
+
+        test = pending[0]
+        print(colorama.Fore.CYAN + f"[INFO] Running {test}")
+        process = subprocess.Popen([sys.executable, __file__, "-t", test] + child_args,
+                                   start_new_session=os.name != "nt")
+        cancelled = False
+        while process.poll() is None:
+            try:
+                changed = changes.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            affected = affected_tests(changed)
+            pending = list(dict.fromkeys(pending + affected))
+            if test not in affected:
+                continue
+            # A newer save makes this run stale, start over with everything affected
+            kill_process_tree(process)
+            cancelled = True
+            print(colorama.Fore.YELLOW + f"[INFO] {test} cancelled by a newer change")
+            pending = list(dict.fromkeys(affected + pending))
+            break
+
+        if not cancelled:
+            pending.pop(0)
+            if not pending:
+                print(colorama.Fore.CYAN + "[INFO] Waiting for changes...")
+
+
+def merge_results(report_files):
+    """
+    Combine shard reports into one. Exits with 1 unless every shard ran, every
+    test (of the changed-file selection, if the shards used one) was reported
+    and all tests passed.
+    """
+    results, outputs, problems, selected = merge_reports(report_files)
+    expected = set(discover_tests() if selected is None else selected)
+    reported = {r.name for r in results}
+    problems += [f"test {name} missing from the shard reports" for name in sorted(expected - reported)]
+    problems += [f"test {name} is not a test of this project" for name in sorted(reported - expected)]
+    for problem in problems:
+        print(colorama.Fore.RED + f"[ERROR] {problem}")
+    if not results:
+        print(colorama.Fore.RED + "No test results to merge.")
+        sys.exit(1)
+
+    print_summary(results, sum(r.duration for r in results))
+    write_reports(results, outputs, selected=selected)
+    sys.exit(0 if not problems and all(r.passed for r in results) else 1)
+
+
+def parse_shard(value):
+    """argparse type of -shard: 'K/N' -> (K, N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected K/N, e.g. 2/4")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {value} out of range")
+    return index, count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Vivado simulations outside Vivado for faster execution.")
+    parser.add_argument("-l", action="store_true", help="List available tests")
+    parser.add_argument("-t", type=str, help="Run the specified test")
+    parser.add_argument("-g", action="store_true", help="Show GUI (use with -t)")
+    parser.add_argument("-a", action="store_true", help="Run all available tests")
+    parser.add_argument("-j", type=int, default=1, help="Number of tests run in parallel (use with -a)")
+    parser.add_argument("-prj", action="store_true", help="Update .prj file of run test. (use with -t)")
+    parser.add_argument("-ff", action="store_true", help="Stop a simulation at its first fatal error (batch mode)")
+    parser.add_argument("-inc", action="store_true", help="Compile sources incrementally into persistent libraries")
+    parser.add_argument("-shard", type=parse_shard, metavar="K/N", help="Run only shard K of N of all tests (use with -a)")
+    parser.add_argument("-timings", metavar="FILE", help="Results JSON of an earlier run, to balance shards by test duration")
+    parser.add_argument("-merge", nargs="+", metavar="FILE", help="Merge shard result JSON files into one report")
+    parser.add_argument("-changed", metavar="RANGE",
+                        help="Run only tests affected by the files changed in a git revision range, e.g. main...HEAD (use with -a)")
+    parser.add_argument("-files", nargs="+", metavar="FILE", help="Run only tests affected by these files (use with -a)")
+    parser.add_argument("-timeout", type=float, metavar="SECONDS",
+                        help="Kill simulations running longer than this (default: from the test's runtime history, 0 disables)")
+    parser.add_argument("-wscope", default=WAVE_SCOPE, metavar="SCOPE",
+                        help=f"Scope whose waves are logged when a failed test is rerun (default: {WAVE_SCOPE}, the whole design)")
+    parser.add_argument("-nw", action="store_true", help="Don't rerun failed tests with waveform logging")
+    parser.add_argument("-profile", choices=PROFILES,
+                        help=f"xelab option profile of the tests without PROFILE in their sim_profile.env (default: {DEFAULT_PROFILE})")
+    parser.add_argument("-w", action="store_true",
+                        help="Watch sources and rerun affected tests on every change (all tests, or the one given with -t)")
+
+    args = parser.parse_args(argv)
+
+    colorama.init(autoreset=True)
+
+    # Merging runs on CI nodes without Vivado, so it doesn't need VIVADO_SETUP
+    if args.merge:
+        configure(get_config("ROOT_DIR"))
+        merge_results(args.merge)
+
+    configure(get_config("ROOT_DIR", "VIVADO_SETUP"))
+    wave_scope = None if args.nw else args.wscope
+
+    if args.w:
+        child_args = child_arguments(args.ff, args.inc, args.timeout, wave_scope, args.profile)
+        try:
+            watch([args.t] if args.t else discover_tests(), child_args, args.prj)
+        except KeyboardInterrupt:
+            print("\nWatch mode stopped.")
+    elif args.l:
+        list_available_tests()
+    elif args.a:
+        changed = None
+        if args.changed or args.files:
+            changed = (changed_files(args.changed) if args.changed else []) + (args.files or [])
+        run_all(args.j, args.ff, args.inc, args.shard, args.timings, changed, args.timeout, wave_scope, args.profile)
+    elif args.t:
+        timeout = args.timeout if args.timeout is not None else sim_timeout(load_history(ROOT_DIR), args.t)
+        result = execute_test(args.t, args.g, args.prj, args.ff, args.inc, timeout or None, wave_scope, args.profile)
+        finish_trace(os.path.join(BUILD_DIR, args.t, TRACE_FILE), f"run_simulation {args.t}")
+        sys.exit(0 if result is None or result.passed else 1)
+    else:
+        parser.print_help()
         sys.exit(1)
 
-    for test in tests:
-        print(f"Running {test}: ", end="")
-        process = subprocess.run(["python", __file__, "-t", test], stdout=subprocess.PIPE, text=True)
-        error_count = process.stdout.lower().count("error")
-        
-        if error_count == 0:
-            print(colorama.Fore.GREEN + "PASSED")
-        else:
-            print(colorama.Fore.GREEN + "FAILED")
-    sys.exit(0)
 
-parser = argparse.ArgumentParser(description="Run Vivado simulations outside Vivado for faster execution.")
-parser.add_argument("-l", action="store_true", help="List available tests")
-parser.add_argument("-t", type=str, help="Run the specified test")
-parser.add_argument("-g", action="store_true", help="Show GUI (use with -t)")
-parser.add_argument("-a", action="store_true", help="Run all available tests")
-parser.add_argument("-prj", action="store_true", help="Update .prj file of run test. (use with -t)")
-
-args = parser.parse_args()
-
-if args.l:
-    list_available_tests()
-elif args.a:
-    run_all()
-elif args.t:
-    execute_test(args.t, args.g, args.prj)
-else:
-    parser.print_help()
-    sys.exit(1)
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,139 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Run the VUnit testbenches of the project. Sources are found the same way as
+# for the xsim .prj files (sim/common, rtl and fpga directories) and every
+# *vunit* file in the test directories is added as a testbench. The Xilinx
+# unisim/secureip VHDL libraries are compiled once per simulator and Vivado
+# version into the toolchain cache and used as an external library afterwards.
+# The unisim source patterns can be changed with VUNIT_UNISIM_SOURCES in .env
+# (space separated, relative to data/vhdl/src of the Vivado installation).
+# All VUnit options are passed through (see "run_vunit.py -h"); the number of
+# parallel threads defaults to the number of CPU cores.
+# Usage: python run_vunit.py [VUnit options] [test patterns]
+# ------------------------------------------------------------------------------
+import os
 import sys
-from pathlib import Path
-from vunit import VUnit
+import glob
+import shutil
+import colorama
+from add_files_to_prj import HDL_EXTS, shared_sources
+from file_index import get_index
+from toolchain_cache import cache_dir, file_lock, write_text_atomic
+from bitstream_cache import vivado_version
+from vtc_config import get_config
 
-PROJECT_PATH = Path(__file__).resolve().parent.parent.as_posix()
-VUNIT_PATH = r"C:\Users\wojte\AppData\Local\Programs\Python\Python312\Lib\site-packages\vunit\verilog"
+UNISIM_LIBRARY = "unisim"
+TESTBENCH_LIBRARY = "testbench_lib"
+TESTBENCH_PATTERN = "vunit"
+KEY_FILE = "key.txt"
+
+# Default unisim sources, relative to data/vhdl/src of the Vivado installation
+UNISIM_SOURCES = [
+    "*.vhd",
+    "unisims/*.vhd",
+    "unisims/primitive/*.vhd",
+    "unisims/secureip/*.vhd",
+]
+
+
+def vivado_install_dir(vivado_dir):
+    """Vivado installation directory from VIVADO_DIR (with or without the bin directory)."""
+    vivado_dir = os.path.normpath(vivado_dir)
+    return os.path.dirname(vivado_dir) if os.path.basename(vivado_dir) == "bin" else vivado_dir
+
+
+def find_testbenches(root_dir, sim_dir):
+    """VUnit testbenches in the test directories of 'sim_dir'."""
+    common_dir = os.path.join(os.path.abspath(sim_dir), "common")
+    return [path for path in get_index(root_dir).files(sim_dir, HDL_EXTS)
+            if TESTBENCH_PATTERN in os.path.basename(path).lower() and not path.startswith(common_dir)]
+
+
+def parallel_argv(argv):
+    """Add the VUnit thread count option if it isn't given."""
+    if any(arg.startswith("-p") or arg.startswith("--num-threads") for arg in argv):
+        return argv
+    return argv + ["-p", str(os.cpu_count() or 1)]
+
+
+def compiled_unisim(root_dir, vivado_dir, source_patterns=UNISIM_SOURCES):
+    """
+    Return the directory of the precompiled unisim library for the selected
+    simulator, compiling it first if the cached one is missing or was built
+    by another simulator, Vivado version or list of source patterns.
+    """
+    from vunit import VUnit
+    from vunit.sim_if.factory import SIMULATOR_FACTORY
+
+    simulator = SIMULATOR_FACTORY.select_simulator()
+    output_dir = cache_dir(root_dir, "vunit_unisim", simulator.name)
+    library_dir = os.path.join(output_dir, simulator.name, "libraries", UNISIM_LIBRARY)
+    key = (f"simulator={simulator.name}\nprefix={simulator.find_prefix()}\n"
+           f"vivado={vivado_version(vivado_dir)}\nsources={' '.join(source_patterns)}\n")
+    key_file = os.path.join(output_dir, KEY_FILE)
+
+    # Concurrent runs wait for the one compiling the library
+    with file_lock(os.path.join(output_dir, ".lock")):
+        if os.path.isdir(library_dir) and os.path.isfile(key_file):
+            with open(key_file, "r") as f:
+                if f.read() == key:
+                    return library_dir
+
+        print(colorama.Fore.BLUE + f"[INFO] Compiling {UNISIM_LIBRARY} library for {simulator.name} "
+              f"(Vivado {vivado_version(vivado_dir)}), this is done once.")
+        shutil.rmtree(os.path.join(output_dir, simulator.name), ignore_errors=True)
+        if os.path.exists(key_file):
+            os.remove(key_file)
+
+        source_dir = os.path.join(vivado_install_dir(vivado_dir), "data", "vhdl", "src")
+        vu = VUnit.from_argv(argv=parallel_argv(["--compile", "-o", output_dir]), compile_builtins=False)
+        library = vu.add_library(UNISIM_LIBRARY)
+        for pattern in source_patterns:
+            library.add_source_files(os.path.join(source_dir, pattern), allow_empty=True)
+        try:
+            vu.main()
+        except SystemExit as e:
+            if e.code:
+                print(colorama.Fore.RED + f"[ERROR] Compilation of the {UNISIM_LIBRARY} library failed.")
+                sys.exit(1)
+
+        write_text_atomic(key_file, key)
+    return library_dir
 
 
 def main(argv=None):
-    if argv is None:
-        vu = VUnit.from_argv(compile_builtins=False)
+    colorama.init(autoreset=True)
+    argv = sys.argv[1:] if argv is None else argv
+
+    config = get_config("ROOT_DIR", "VIVADO_DIR")
+    ROOT_DIR = config["ROOT_DIR"]
+    sim_dir = os.path.join(ROOT_DIR, "sim")
+
+    import vunit
+    from vunit import VUnit
+
+    # Help and test listing don't need the unisim library
+    if not any(arg in ("-h", "--help", "-l", "--list", "--files") for arg in argv):
+        source_patterns = config.get("VUNIT_UNISIM_SOURCES", "").split() or UNISIM_SOURCES
+        unisim_dir = compiled_unisim(ROOT_DIR, config["VIVADO_DIR"], source_patterns)
     else:
-        vu = VUnit.from_argv(argv=argv, compile_builtins=False)
-
-    
-    unisim_files = [
-        r"C:\Xilinx\Vivado\2023.1\data\vhdl\src\unisims\*.vhd",
-        f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/unisims/secureip/*.vhd",
-        f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/*.vhd",
-    ]
-    u_lib = vu.add_library("unisim", allow_duplicate=True)
-    
-    for file in unisim_files:
-        u_lib.add_source_files(file, allow_empty=True)
-
-        
-
-
-    source_files = [
-        # r"C:\Xilinx\Vivado\2023.1\data\vhdl\src\unisims\*.vhd",
-        # f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/unisims/primitive/IBUF.vhd",
-        # f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/unisims/primitive/BUFG.vhd",
-        # f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/unisims/primitive/BUFGCE.vhd",
-        # f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/unisims/primitive/BUFH.vhd",
-        # f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/unisims/primitive/MMCME2_ADV.vhd",
-        f"C:/Xilinx/Vivado/2023.1/data/vhdl/src/*.vhd",
-        f"{VUNIT_PATH}/*.sv",
-        f"{PROJECT_PATH}/fpga/rtl/import/*.vhd",
-        f"{PROJECT_PATH}/sim/common/logger_pkg.sv",
-        f"{PROJECT_PATH}/rtl/z_game_setup/defuser.sv",
-        f"{PROJECT_PATH}/sim/defuser/defuser_vunit_tb.sv",
-        f"{PROJECT_PATH}/fpga/rtl/*.sv",
-        f"{PROJECT_PATH}/fpga/rtl/*.v",
-        f"{PROJECT_PATH}/rtl/**/*.sv",
-        f"{PROJECT_PATH}/rtl/**/*.v",
-        f"{PROJECT_PATH}/rtl/**/*.vhd",
-        f"{PROJECT_PATH}/sim/top_memory_logic/top_memory_logic_tb_vunit.sv"
-    ]
-
-    lib = vu.add_library("testbench_lib", allow_duplicate=True)
-
-    for file in source_files:
-        lib.add_source_files(file, allow_empty=True)
-        # u_lib.add_source_files(file, allow_empty=True)
-
-    # vu.add_compile_option("activehdl.vlog_flags", ["-dbg", "-work testbench_lib", "-v2k5", "-l unisim"])
+        unisim_dir = None
+
+    vu = VUnit.from_argv(argv=parallel_argv(argv), compile_builtins=False)
+    if unisim_dir:
+        vu.add_external_library(UNISIM_LIBRARY, unisim_dir)
+
+    testbenches = find_testbenches(ROOT_DIR, sim_dir)
+    if not testbenches:
+        print(colorama.Fore.YELLOW + f"[WARNING] No *{TESTBENCH_PATTERN}* testbenches found in {sim_dir}")
+
+    lib = vu.add_library(TESTBENCH_LIBRARY)
+    lib.add_source_files(glob.glob(os.path.join(os.path.dirname(vunit.__file__), "verilog", "*.sv")))
+    lib.add_source_files(shared_sources(sim_dir) + testbenches)
     vu.main()
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -5,7 +5,8 @@
 # Description:
 # Additional tcl commands for a simulation with xsim
 
-# Specify waves to be saved during the simulation
+# Specify waves to be saved during the simulation. Batch regressions log no waves,
+# failed tests are rerun with log_wave by run_simulation script (see -wscope).
 # log_wave *      # top module signals only
 # log_wave -r * # all the design signals
 
@@ -0,0 +1,73 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Runtime history of the simulations, used by run_simulation script. After every
+# batch run the elaboration and simulation time of the test is appended to a JSON
+# file in the toolchain cache (the last HISTORY_LENGTH runs per test are kept).
+# The history gives every test its own xsim timeout (p95 of its simulation times
+# times TIMEOUT_FACTOR) and the expected duration used to start the longest
+# tests of a regression first.
+# ------------------------------------------------------------------------------
+import os
+import json
+import math
+import statistics
+from toolchain_cache import cache_dir, file_lock, write_text_atomic
+
+HISTORY_FILE = "sim_history.json"
+HISTORY_LENGTH = 20
+
+TIMEOUT_FACTOR = 3
+TIMEOUT_PERCENTILE = 95
+MIN_TIMEOUT = 60            # seconds, short simulations still get some slack
+DEFAULT_TIMEOUT = 1800      # seconds, tests without enough history
+MIN_SAMPLES = 3
+
+
+def _history_file(root_dir):
+    return os.path.join(cache_dir(root_dir), HISTORY_FILE)
+
+
+def load_history(root_dir):
+    """Return {test: [{"elab": s, "sim": s, "cached": bool}, ...]}, oldest run first."""
+    try:
+        with open(_history_file(root_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_run(root_dir, result):
+    """Append the times of a finished test result. Timed out runs are not recorded."""
+    if result.timed_out or not result.sim_time:
+        return
+    path = _history_file(root_dir)
+    # Tests of a parallel regression finish at the same time
+    with file_lock(path + ".lock"):
+        history = load_history(root_dir)
+        runs = history.setdefault(result.name, [])
+        runs.append({"elab": round(result.elab_time, 3), "sim": round(result.sim_time, 3),
+                     "cached": result.elab_cached})
+        del runs[:-HISTORY_LENGTH]
+        write_text_atomic(path, json.dumps(history, indent=1))
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def sim_timeout(history, test):
+    """xsim timeout of 'test' in seconds, derived from its simulation times."""
+    times = [run["sim"] for run in history.get(test, [])]
+    if len(times) < MIN_SAMPLES:
+        return DEFAULT_TIMEOUT
+    return max(MIN_TIMEOUT, math.ceil(percentile(times, TIMEOUT_PERCENTILE) * TIMEOUT_FACTOR))
+
+
+def expected_durations(history):
+    """Return {test: median duration of its runs} for ordering and sharding."""
+    return {test: statistics.median(run["elab"] + run["sim"] for run in runs)
+            for test, runs in history.items() if runs}
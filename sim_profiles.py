@@ -0,0 +1,75 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# xelab option profiles used by run_simulation script. A profile sets the
+# optimization level, debug visibility, multithreading, code coverage and the
+# libraries of the elaboration. The profile of a test is, in order of precedence:
+# PROFILE in a sim_profile.env file in the test directory, the -profile option of
+# the run, the default profile. A test that pins a profile (e.g. debug) keeps it
+# in a run with another -profile. Example sim_profile.env:
+#   PROFILE=fast
+#   LIBRARIES=xpm unimacro_ver
+#   XELAB_OPTS=--relax
+# LIBRARIES and XELAB_OPTS of the file are added to every profile of the test.
+# Every profile elaborates its own snapshot, so they never overwrite each other.
+# ------------------------------------------------------------------------------
+import os
+from vtc_config import load_env
+
+PROFILE_FILE = "sim_profile.env"
+DEFAULT_PROFILE = "default"
+
+# Profile -> xelab settings (None leaves the xelab default)
+PROFILES = {
+    "default":  {"optimize": None, "debug": None,  "mt": None,   "coverage": None,   "libraries": ["unisims_ver"]},
+    "fast":     {"optimize": 3,    "debug": None,  "mt": "auto", "coverage": None,   "libraries": ["unisims_ver"]},
+    "debug":    {"optimize": 0,    "debug": "all", "mt": "off",  "coverage": None,   "libraries": ["unisims_ver"]},
+    "coverage": {"optimize": None, "debug": None,  "mt": None,   "coverage": "sbct", "libraries": ["unisims_ver"]},
+}
+
+
+def test_settings(test_path):
+    """Return (profile name or None, extra libraries, extra xelab options) from the test's profile file."""
+    settings = load_env(os.path.join(test_path, PROFILE_FILE))
+    profile = settings.get("PROFILE") or None
+    if profile and profile not in PROFILES:
+        raise ValueError(f"unknown profile '{profile}' in {os.path.join(test_path, PROFILE_FILE)}")
+    return profile, settings.get("LIBRARIES", "").split(), settings.get("XELAB_OPTS", "")
+
+
+def snapshot_name(test_name, profile, debug=None):
+    """Snapshot of a test elaborated with 'profile' (and the raised 'debug' visibility)."""
+    name = f"{test_name}_tb"
+    if profile != DEFAULT_PROFILE:
+        name += f"_{profile}"
+    if debug and PROFILES[profile]["debug"] in (None, "off", "line"):
+        name += f"_{debug}"
+    return name
+
+
+def xelab_options(profile, libraries=(), extra_opts="", debug=None, coverage_dir=None, coverage_db=None):
+    """
+    xelab options of 'profile' (without the design and snapshot). 'debug' raises the
+    debug visibility (e.g. "typical" for the GUI and waveform reruns).
+    """
+    settings = PROFILES[profile]
+    opts = ["-timescale 1ns/1ps"]
+    opts += [f"-L {library}" for library in dict.fromkeys([*settings["libraries"], *libraries])]
+    if settings["optimize"] is not None:
+        opts.append(f"-O{settings['optimize']}")
+    if debug and settings["debug"] in (None, "off", "line"):
+        opts.append(f"-debug {debug}")
+    elif settings["debug"]:
+        opts.append(f"-debug {settings['debug']}")
+    if settings["mt"]:
+        opts.append(f"-mt {settings['mt']}")
+    if settings["coverage"]:
+        opts.append(f"-cc_type {settings['coverage']}")
+        if coverage_db:
+            opts.append(f"-cc_db {coverage_db}")
+        if coverage_dir:
+            opts.append(f"-cc_dir {coverage_dir}")
+    if extra_opts:
+        opts.append(extra_opts)
+    return " ".join(opts)
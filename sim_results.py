@@ -0,0 +1,203 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Simulation log classification and structured test results. Every line of
+# xelab/xsim output is classified with anchored regular expressions (so a signal
+# named error_cnt does not fail a test) and summed up in a per-test result record.
+# Records of a regression are written as JSON and JUnit XML for CI. Regressions
+# can be split into shards (balanced by the runtimes of an earlier report) and
+# the shard reports merged back into one.
+# ------------------------------------------------------------------------------
+import os
+import re
+import json
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field, asdict
+
+RESULT_FILE = "result.json"
+
+# Severities in decreasing order, each with the patterns that select it
+SEVERITIES = ["fatal", "error", "critical_warning", "warning"]
+FAILING_SEVERITIES = {"fatal", "error"}
+
+SEVERITY_PATTERNS = [
+    ("fatal",            re.compile(r"^\s*(?:fatal(?:_error)?\b|UVM_FATAL\s*[@(])", re.I)),
+    ("error",            re.compile(r"^\s*(?:error\b|UVM_ERROR\s*[@(])", re.I)),
+    # Testbenches report failed checks with an upper case FAILED
+    ("error",            re.compile(r"\bFAILED\b")),
+    ("critical_warning", re.compile(r"^\s*critical warning\b", re.I)),
+    ("warning",          re.compile(r"^\s*(?:warning\b|UVM_WARNING\s*[@(])", re.I)),
+]
+
+
+def classify_line(line):
+    """Return the severity of a single log line, or None for plain output."""
+    for severity, pattern in SEVERITY_PATTERNS:
+        if pattern.search(line):
+            return severity
+    return None
+
+
+class LogClassifier:
+    """Counts severities over a stream of log lines and remembers the first failure."""
+
+    def __init__(self):
+        self.counts = {severity: 0 for severity in SEVERITIES}
+        self.first_failure = None
+
+    def feed(self, line):
+        """Classify one line, update the counters and return its severity."""
+        severity = classify_line(line)
+        if severity:
+            self.counts[severity] += 1
+            if severity in FAILING_SEVERITIES and self.first_failure is None:
+                self.first_failure = line.strip()
+        return severity
+
+    @property
+    def failed(self):
+        return any(self.counts[severity] for severity in FAILING_SEVERITIES)
+
+
+@dataclass
+class TestResult:
+    """Result record of a single test."""
+    name: str
+    status: str = "passed"          # passed, failed or error (test could not be run)
+    elab_time: float = 0.0
+    sim_time: float = 0.0
+    elab_cached: bool = False
+    timed_out: bool = False
+    wave_file: str = None           # waveform database of the rerun of a failed test
+    first_failure: str = None
+    counts: dict = field(default_factory=lambda: {severity: 0 for severity in SEVERITIES})
+
+    @property
+    def passed(self):
+        return self.status == "passed"
+
+    @property
+    def duration(self):
+        return self.elab_time + self.sim_time
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def write_json_report(results, path, outputs=None, shard=None, selected=None):
+    """
+    Write all result records and totals into a single JSON file. 'outputs' maps
+    names of failed tests to their captured output, 'shard' is (index, count),
+    'selected' the tests chosen by changed files before sharding (None: all tests).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    report = {
+        "shard":  list(shard) if shard else None,
+        "selected": sorted(selected) if selected is not None else None,
+        "tests":  len(results),
+        "passed": sum(1 for r in results if r.passed),
+        "failed": sum(1 for r in results if r.status == "failed"),
+        "errors": sum(1 for r in results if r.status == "error"),
+        "time":   round(sum(r.duration for r in results), 3),
+        "results": [asdict(r) for r in sorted(results, key=lambda r: r.name)],
+        "outputs": dict(outputs or {}),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def write_junit_report(results, path, suite_name="simulation", outputs=None):
+    """Write result records as JUnit XML. 'outputs' maps test names to captured output."""
+    outputs = outputs or {}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    suites = ET.Element("testsuites")
+    suite = ET.SubElement(suites, "testsuite", {
+        "name":     suite_name,
+        "tests":    str(len(results)),
+        "failures": str(sum(1 for r in results if r.status == "failed")),
+        "errors":   str(sum(1 for r in results if r.status == "error")),
+        "time":     f"{sum(r.duration for r in results):.3f}",
+    })
+    for r in sorted(results, key=lambda r: r.name):
+        case = ET.SubElement(suite, "testcase", {"name": r.name, "classname": suite_name,
+                                                 "time": f"{r.duration:.3f}"})
+        if not r.passed:
+            tag = "failure" if r.status == "failed" else "error"
+            ET.SubElement(case, tag, {"message": r.first_failure or r.status}).text = r.first_failure
+            if r.name in outputs:
+                ET.SubElement(case, "system-out").text = outputs[r.name]
+
+    ET.indent(suites)
+    ET.ElementTree(suites).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def load_json_report(path):
+    """Return (results, outputs, shard) of a JSON report."""
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    results = [TestResult(**record) for record in report["results"]]
+    shard = tuple(report["shard"]) if report.get("shard") else None
+    return results, report.get("outputs", {}), shard
+
+
+def shard_tests(tests, index, count, durations=None):
+    """
+    Return the tests of shard 'index' (1-based) out of 'count'. Tests are dealt
+    longest first to the least loaded shard, using 'durations' (name -> seconds,
+    e.g. from an earlier report); unknown tests count as the average duration.
+    The split only depends on the arguments, so every CI node computes the same one.
+    """
+    durations = durations or {}
+    known = [durations[t] for t in tests if t in durations]
+    default = sum(known) / len(known) if known else 1.0
+
+    loads = [0.0] * count
+    selected = []
+    for test in sorted(tests, key=lambda t: (-durations.get(t, default), t)):
+        shard = min(range(count), key=lambda i: (loads[i], i))
+        loads[shard] += durations.get(test, default)
+        if shard == index - 1:
+            selected.append(test)
+    return sorted(selected)
+
+
+def merge_reports(paths):
+    """
+    Combine shard reports. Returns (results, outputs, problems, selected), where
+    'problems' lists missing or duplicate shards and tests, and 'selected' is the
+    changed-file selection of the shards (None if they ran all tests).
+    """
+    results, outputs, problems = {}, {}, []
+    selected = None
+    shards, shard_count = set(), None
+    for path in paths:
+        shard_results, shard_outputs, shard = load_json_report(path)
+        with open(path, "r", encoding="utf-8") as f:
+            shard_selected = json.load(f).get("selected")
+        if shard_selected is not None:
+            if selected is not None and set(shard_selected) != selected:
+                problems.append(f"shards selected different tests ({path})")
+            selected = (selected or set()) | set(shard_selected)
+        if shard:
+            if shard in shards:
+                problems.append(f"shard {shard[0]}/{shard[1]} reported twice ({path})")
+            shards.add(shard)
+            shard_count = shard_count or shard[1]
+        for result in shard_results:
+            if result.name in results:
+                problems.append(f"test {result.name} reported twice ({path})")
+            results[result.name] = result
+        outputs.update(shard_outputs)
+
+    if shard_count:
+        missing = [i for i in range(1, shard_count + 1) if (i, shard_count) not in shards]
+        problems += [f"shard {i}/{shard_count} missing" for i in missing]
+    return list(results.values()), outputs, problems, selected
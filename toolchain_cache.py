@@ -0,0 +1,70 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Helpers for the persistent toolchain cache. The cache lives in .vtc_cache in
+# the project root. Git clean calls of the toolchain exclude everything below
+# it, also files matching other ignore rules (xsim.dir/, *.bit, *.dcp), so
+# expensive results (snapshots, indexes, checkpoints) survive between runs.
+# ------------------------------------------------------------------------------
+import os
+import time
+import hashlib
+from contextlib import contextmanager
+
+CACHE_DIR_NAME = ".vtc_cache"
+
+# Pass to "git clean -X" so nothing in the cache is removed. Re-including only the
+# directory ("!.vtc_cache/") still lets files inside it match other ignore rules.
+GIT_CLEAN_KEEP = ["-e", f"!{CACHE_DIR_NAME}/**"]
+
+
+def cache_dir(root_dir, *parts):
+    """Return (and create) a directory inside the project cache."""
+    path = os.path.join(root_dir, CACHE_DIR_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_text_atomic(path, text):
+    """Write a text file so readers never see a partially written version."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on 'path' (created if needed) across processes."""
+    with open(path, "a+") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.2)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,136 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Long-lived Vivado Tcl session used by vivado_session.py. Listens on a local
+# socket and evaluates the scripts it receives, so generate_bitstream and
+# program_fpga scripts don't pay for the tool startup on every invocation.
+# Works in any Tcl interpreter (e.g. tclsh), which is handy for testing.
+#
+# Usage: vivado -mode tcl -source vivado_server.tcl -tclargs <port_file>
+#
+# Protocol (all lengths in characters, utf-8, lf line endings):
+#   request:  <token> <length>\n<script>
+#   response: <ok|error> <length>\n<result>
+# The token is a random secret written to the port file next to the port, so
+# only the session owner can run scripts. vivado_session.py passes it in the
+# VTC_SESSION_TOKEN environment variable; without it one is generated here.
+# Output printed with puts to stdout during a request is returned in front
+# of the result. Messages of Vivado itself stay in the server console/log.
+
+proc ::vtc_random_token {} {
+    if {![catch {open /dev/urandom rb} fd]} {
+        binary scan [read $fd 24] H* token
+        close $fd
+        return $token
+    }
+    expr {srand([clock microseconds] ^ [pid])}
+    set token ""
+    for {set i 0} {$i < 48} {incr i} {
+        append token [format %x [expr {int(rand() * 16)}]]
+    }
+    return $token
+}
+
+namespace eval ::vtc {
+    variable port_file [lindex $::argv 0]
+    variable token [expr {[info exists ::env(VTC_SESSION_TOKEN)] ? $::env(VTC_SESSION_TOKEN) : [::vtc_random_token]}]
+    variable output ""
+    variable capturing 0
+    variable running 1
+}
+
+# Scripts sourced through the server must not end the session
+rename exit ::vtc::real_exit
+proc exit {{code 0}} {
+    return -code error -errorcode [list VTC_EXIT $code] "exit $code"
+}
+
+# Capture puts to stdout while a request is evaluated
+rename puts ::vtc::real_puts
+proc puts {args} {
+    set to_stdout [expr {[llength $args] == 1
+                         || ([llength $args] == 2 && [lindex $args 0] eq "-nonewline")
+                         || [lindex $args end-1] eq "stdout"}]
+    if {$::vtc::capturing && $to_stdout} {
+        append ::vtc::output [lindex $args end]
+        if {[lindex $args 0] ne "-nonewline"} {
+            append ::vtc::output "\n"
+        }
+    }
+    uplevel 1 [list ::vtc::real_puts {*}$args]
+}
+
+proc ::vtc::shutdown {} {
+    variable running
+    set running 0
+    return "bye"
+}
+
+proc ::vtc::evaluate {script} {
+    variable output ""
+    variable capturing 1
+    set code [catch {uplevel #0 $script} result options]
+    set capturing 0
+
+    set status "ok"
+    if {$code == 1} {
+        set error_code [dict get $options -errorcode]
+        if {[lindex $error_code 0] eq "VTC_EXIT"} {
+            # exit 0 at the end of a flow script is a success
+            if {[lindex $error_code 1] != 0} {
+                set status "error"
+            }
+            set result ""
+        } else {
+            set status "error"
+        }
+    }
+    return [list $status "$output$result"]
+}
+
+proc ::vtc::on_request {chan} {
+    if {[gets $chan header] < 0} {
+        close $chan
+        return
+    }
+    lassign $header token length
+    if {$token ne $::vtc::token || ![string is integer -strict $length]} {
+        set result "invalid session token"
+        ::vtc::real_puts $chan "error [string length $result]"
+        ::vtc::real_puts -nonewline $chan $result
+        close $chan
+        return
+    }
+    set script [read $chan $length]
+    lassign [::vtc::evaluate $script] status result
+
+    ::vtc::real_puts $chan "$status [string length $result]"
+    ::vtc::real_puts -nonewline $chan $result
+    flush $chan
+
+    if {!$::vtc::running} {
+        close $chan
+        set ::vtc::done 1
+    }
+}
+
+proc ::vtc::accept {chan addr port} {
+    fconfigure $chan -translation lf -encoding utf-8 -buffering full
+    fileevent $chan readable [list ::vtc::on_request $chan]
+}
+
+set ::vtc::server [socket -server ::vtc::accept -myaddr 127.0.0.1 0]
+set ::vtc::port [lindex [fconfigure $::vtc::server -sockname] 2]
+
+# Publish the port only once the server is ready to accept connections,
+# readable by the owner only (on Windows the cache directory permissions apply)
+set fd [open "$::vtc::port_file.tmp" {WRONLY CREAT TRUNC} 0600]
+::vtc::real_puts $fd "$::vtc::port [pid] $::vtc::token"
+close $fd
+file rename -force "$::vtc::port_file.tmp" $::vtc::port_file
+::vtc::real_puts "Vivado session listening on 127.0.0.1:$::vtc::port"
+
+vwait ::vtc::done
+close $::vtc::server
+file delete -force $::vtc::port_file
+::vtc::real_exit 0
@@ -0,0 +1,161 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Optional long-lived Vivado session. "start" launches Vivado in tcl mode with
+# vivado_server.tcl, which keeps the tool (and its license) loaded and evaluates
+# scripts sent over a local socket. generate_bitstream and program_fpga scripts
+# use the session when it is running and fall back to one-shot Vivado otherwise.
+# Usage: python vivado_session.py start|stop|status [--exe tclsh]
+# (--exe runs the server in another Tcl interpreter, e.g. tclsh for testing)
+
+import os
+import sys
+import time
+import socket
+import secrets
+import argparse
+import subprocess
+import colorama
+from toolchain_cache import cache_dir
+from vtc_config import get_config
+
+SERVER_TCL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vivado_server.tcl")
+PORT_FILE_NAME = "vivado_session.port"
+TOKEN_ENV = "VTC_SESSION_TOKEN"
+START_TIMEOUT = 300 # seconds, Vivado startup with license checkout can be slow
+
+
+class VivadoSessionError(Exception):
+    """Raised when a script evaluated in the session fails."""
+
+
+class VivadoSession:
+    """Client of a running vivado_server.tcl."""
+
+    def __init__(self, port, pid=None, token=""):
+        self.port = port
+        self.pid = pid
+        self.token = token
+
+    def run(self, script):
+        """Evaluate a Tcl script in the session and return its output and result."""
+        with socket.create_connection(("127.0.0.1", self.port)) as sock:
+            with sock.makefile("rw", encoding="utf-8", newline="\n") as chan:
+                chan.write(f"{self.token} {len(script)}\n{script}")
+                chan.flush()
+                header = chan.readline().split()
+                if len(header) != 2:
+                    raise VivadoSessionError("Vivado session closed the connection")
+                status, length = header[0], int(header[1])
+                result = chan.read(length)
+        if status != "ok":
+            raise VivadoSessionError(result)
+        return result
+
+    def source(self, tcl_file, cwd, args=()):
+        """Source a tcl file from 'cwd', like 'vivado -mode tcl -source <file> -tclargs <args>'."""
+        tcl_args = " ".join("{" + arg + "}" for arg in args)
+        return self.run(f"cd {{{_tcl_path(cwd)}}}\n"
+                        f"set ::argv [list {tcl_args}]\n"
+                        f"set ::argc {len(args)}\n"
+                        f"source {{{_tcl_path(tcl_file)}}}\n")
+
+    def shutdown(self):
+        self.run("::vtc::shutdown")
+
+
+def _tcl_path(path):
+    return os.path.abspath(path).replace("\\", "/")
+
+
+def port_file(root_dir):
+    return os.path.join(cache_dir(root_dir), PORT_FILE_NAME)
+
+
+def connect(root_dir):
+    """Return a session if one is running for this project, otherwise None."""
+    try:
+        with open(port_file(root_dir), "r") as f:
+            port, pid, token = f.read().split()
+        session = VivadoSession(int(port), int(pid), token)
+        session.run("pwd")
+        return session
+    except (OSError, ValueError, VivadoSessionError):
+        # No session, a stale port file or something else listening on the port
+        return None
+
+
+def start(root_dir, command):
+    """Launch the server with 'command' (list) and wait until it accepts connections."""
+    path = port_file(root_dir)
+    if os.path.exists(path):
+        os.remove(path)
+
+    log = open(os.path.join(cache_dir(root_dir), "vivado_session.log"), "w")
+    creationflags = subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0
+    # The token goes through the environment, the command line is visible to other users
+    env = dict(os.environ, **{TOKEN_ENV: secrets.token_hex(24)})
+    process = subprocess.Popen(command + [path], cwd=root_dir, stdin=subprocess.DEVNULL, env=env,
+                               stdout=log, stderr=subprocess.STDOUT,
+                               creationflags=creationflags, start_new_session=os.name != "nt")
+
+    start_time = time.time()
+    while time.time() - start_time < START_TIMEOUT:
+        if process.poll() is not None:
+            return None
+        session = connect(root_dir)
+        if session:
+            return session
+        time.sleep(0.5)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage a long-lived Vivado tcl session.")
+    parser.add_argument("action", choices=["start", "stop", "status"])
+    parser.add_argument("--exe", help="Run the server in this Tcl interpreter instead of Vivado (e.g. tclsh)")
+    args = parser.parse_args(argv)
+
+    colorama.init(autoreset=True)
+    config = get_config("ROOT_DIR")
+    ROOT_DIR = config["ROOT_DIR"]
+    VIVADO_DIR = config.get("VIVADO_DIR")
+
+    session = connect(ROOT_DIR)
+
+    if args.action == "status":
+        if session:
+            print(colorama.Fore.GREEN + f"Vivado session running on port {session.port} (pid {session.pid}).")
+        else:
+            print("No Vivado session running.")
+
+    elif args.action == "stop":
+        if session:
+            session.shutdown()
+            print(colorama.Fore.GREEN + "Vivado session stopped.")
+        else:
+            print("No Vivado session running.")
+
+    elif args.action == "start":
+        if session:
+            print(f"Vivado session already running on port {session.port}.")
+            return
+        if args.exe:
+            command = [args.exe, SERVER_TCL]
+        elif VIVADO_DIR:
+            vivado_executable = os.path.join(VIVADO_DIR, "vivado.bat" if os.name == "nt" else "vivado")
+            command = [vivado_executable, "-mode", "tcl", "-source", SERVER_TCL, "-tclargs"]
+        else:
+            print(colorama.Fore.YELLOW + "VIVADO_DIR is not set. Run env.py first to initialize it.")
+            sys.exit(1)
+
+        print("Starting Vivado session...")
+        session = start(ROOT_DIR, command)
+        if not session:
+            print(colorama.Fore.RED + "Error: Vivado session did not start, see .vtc_cache/vivado_session.log")
+            sys.exit(1)
+        print(colorama.Fore.GREEN + f"Vivado session running on port {session.port} (pid {session.pid}).")
+
+
+if __name__ == "__main__":
+    main()
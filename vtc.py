@@ -0,0 +1,51 @@
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Single entry point of the toolchain. Every subcommand is one of the toolchain
+# scripts; its module is only imported when the subcommand runs, so e.g.
+# "vtc clean" never loads the simulation or image conversion code.
+# Usage: python vtc.py <command> [options]
+#        python vtc.py <command> -h    (options of a command)
+
+import sys
+import importlib
+
+# Subcommand -> (module, description)
+COMMANDS = {
+    "sim":      ("run_simulation",     "Run simulations with xsim"),
+    "vunit":    ("run_vunit",          "Run VUnit testbenches"),
+    "build":    ("generate_bitstream", "Generate the bitstream with Vivado"),
+    "program":  ("program_fpga",       "Load the bitstream to the FPGA"),
+    "clean":    ("clean",              "Remove untracked files from the project"),
+    "img2dat":  ("img2dat_batch",      "Convert images to ROM content files"),
+    "warnings": ("warning_summary",    "Summarize synthesis and implementation warnings"),
+    "session":  ("vivado_session",     "Manage a long-lived Vivado session"),
+    "metrics":  ("build_metrics",      "Show and check historical build metrics"),
+}
+
+
+def print_usage():
+    print("Usage: vtc <command> [options]\n\nCommands:")
+    for name, (_, description) in COMMANDS.items():
+        print(f"  {name:<10}{description}")
+    print("\nRun 'vtc <command> -h' for the options of a command.")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print_usage()
+        sys.exit(0 if argv else 1)
+    if argv[0] not in COMMANDS:
+        print(f"Unknown command '{argv[0]}'.\n")
+        print_usage()
+        sys.exit(1)
+
+    module_name = COMMANDS[argv[0]][0]
+    # Usage messages of the command show "vtc <command>"
+    sys.argv = [f"vtc {argv[0]}"] + argv[1:]
+    importlib.import_module(module_name).main(argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# ------------------------------------------------------------------------------
+# Author: Wojciech Miskowicz
+#
+# Description:
+# Configuration shared by all toolchain scripts. The .env file written by env.py
+# (ROOT_DIR, VIVADO_DIR, VIVADO_SETUP) is read from the current directory once
+# per process.
+# ------------------------------------------------------------------------------
+import os
+import sys
+
+ENV_FILE = ".env"
+
+_config = None
+
+
+def load_env(env_file=ENV_FILE):
+    """Parse KEY=value lines of an env file into a dict (quotes are stripped)."""
+    values = {}
+    if os.path.exists(env_file):
+        with open(env_file, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                values[key.strip()] = value.strip().strip('"')
+    return values
+
+
+def get_config(*required):
+    """
+    Return the .env values. If any of the 'required' keys is not set, print a
+    hint and exit, like every script did on its own before.
+    """
+    global _config
+    if _config is None:
+        _config = load_env()
+    for key in required:
+        if not _config.get(key):
+            import colorama
+            print(colorama.Fore.YELLOW + f"{key} is not set in {ENV_FILE}. Run env.py first to initialize it.")
+            sys.exit(1)
+    return _config
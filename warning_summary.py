@@ -3,10 +3,16 @@
 # Description:
 # Based on work of Piotr Kaczmarczyk, PhD, AGH University of Krakow.
 # Extracts warnings and errors from synthesis and implementation logs.
+# Every run directory is processed (including out-of-context IP runs), each log
+# in a single streaming pass in a separate process. Messages are also grouped by
+# their Vivado message ID (e.g. [Synth 8-327]) with a count and first occurrence.
 import os
 import re
 import glob
+import shutil
+import argparse
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
 
 PROJECT_PATH = os.path.join("fpga", "build")
@@ -15,52 +21,113 @@ LOG_FILE = os.path.join("results", "warning_summary.log")
 SYNTH_IGNORE = re.compile(r"\[Constraints\s18-5210\]|\[Netlist\s29-345\]")
 IMPL_IGNORE = re.compile(r"replace_with_codes_to_be_ignored_only_when_justified")
 
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+SEVERITY = re.compile(r"CRITICAL|WARNING|ERROR")
+MESSAGE_ID = re.compile(r"\[([A-Za-z][\w ]*? [A-Za-z0-9]+-\d+)\]")
+BUILD_PATH = re.compile(r"[A-Za-z]:\\.*?\\fpga\\build\\|/\S*?/fpga/build/")
+NO_ID = "(no id)"
 
-with open(LOG_FILE, "w") as log:
-    log.write("Warnings, critical warnings, and errors from synthesis and implementation\n")
-    log.write(f"Created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
 
-    # ---- SYNTHESIS ----
-    log.write("----SYNTHESIS----\n")
-    synth_logs = glob.glob(os.path.join(PROJECT_PATH, "*.runs", "synth_1", "runme.log"))
+def is_impl_run(run_name):
+    """Implementation runs are named impl_N; everything else is a synthesis run."""
+    return run_name.startswith("impl")
 
-    if synth_logs:
-        found_warnings = False
-        with open(synth_logs[0], "r") as synth_log:
-            for line in synth_log:
-                if re.search(r"CRITICAL|WARNING|ERROR", line) and not SYNTH_IGNORE.search(line):
-                    log.write(line)
-                    found_warnings = True
-        if not found_warnings:
-            log.write("CLEAR :)\n")
-    else:
-        log.write("No synthesis log file found!\n")
-
-    log.write("\n----IMPLEMENTATION----\n")
-    
-    # ---- IMPLEMENTATION ----
-    impl_logs = glob.glob(os.path.join(PROJECT_PATH, "*.runs", "impl_1", "runme.log"))
-
-    if impl_logs:
-        found_warnings = False
-        with open(impl_logs[0], "r") as impl_log:
-            for line in impl_log:
-                if re.search(r"CRITICAL|WARNING|ERROR", line) and not IMPL_IGNORE.search(line):
-                    log.write(line)
-                    found_warnings = True
-        if not found_warnings:
+
+def scan_run_log(run_name, log_path, tmp_path):
+    """
+    Stream one runme.log, writing matching lines (with build paths stripped) to
+    'tmp_path'. Returns (run_name, tmp_path, line_count, ids) where 'ids' maps
+    (severity, message id) to [count, first line].
+    """
+    ignore = IMPL_IGNORE if is_impl_run(run_name) else SYNTH_IGNORE
+    ids = {}
+    line_count = 0
+
+    with open(log_path, "r", errors="replace") as log, open(tmp_path, "w") as out:
+        for line in log:
+            severity = SEVERITY.search(line)
+            if not severity or ignore.search(line):
+                continue
+            line = BUILD_PATH.sub("", line)
+            out.write(line)
+            line_count += 1
+
+            message_id = MESSAGE_ID.search(line)
+            key = (severity.group(0), message_id.group(1) if message_id else NO_ID)
+            if key in ids:
+                ids[key][0] += 1
+            else:
+                ids[key] = [1, line.strip()]
+
+    return run_name, tmp_path, line_count, ids
+
+
+def find_run_logs(project_path=PROJECT_PATH):
+    """Return {run name: runme.log path} for every run directory, sorted by name."""
+    logs = {}
+    for log_path in sorted(glob.glob(os.path.join(project_path, "*.runs", "*", "runme.log"))):
+        logs.setdefault(os.path.basename(os.path.dirname(log_path)), log_path)
+    return logs
+
+
+def write_section(log, title, runs, missing_msg):
+    """Copy the per-run line files of one flow stage into the summary."""
+    log.write(f"----{title}----\n")
+    if not runs:
+        log.write(missing_msg + "\n")
+    for run_name, tmp_path, line_count, _ in runs:
+        log.write(f"== {run_name} ==\n")
+        if line_count:
+            with open(tmp_path, "r") as tmp:
+                shutil.copyfileobj(tmp, log)
+        else:
             log.write("CLEAR :)\n")
-    else:
-        log.write("No implementation log file found!\n")
+        os.remove(tmp_path)
+    log.write("\n")
+
+
+def write_id_summary(log, runs):
+    """Write message counts grouped by Vivado message ID, most frequent first."""
+    totals = {}
+    for run_name, _, _, ids in runs:
+        for key, (count, first_line) in ids.items():
+            if key in totals:
+                totals[key][0] += count
+            else:
+                totals[key] = [count, run_name, first_line]
+
+    log.write("----SUMMARY BY MESSAGE ID----\n")
+    if not totals:
+        log.write("CLEAR :)\n")
+    for (severity, message_id), (count, run_name, first_line) in sorted(
+            totals.items(), key=lambda item: (-item[1][0], item[0])):
+        log.write(f"{count:6d}  {severity:<8}  {message_id:<20}  first in {run_name}: {first_line}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize warnings and errors of the Vivado runs in fpga/build.")
+    parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    run_logs = find_run_logs()
+
+    with ProcessPoolExecutor() as pool:
+        futures = [pool.submit(scan_run_log, run_name, log_path, f"{LOG_FILE}.{run_name}.tmp")
+                   for run_name, log_path in run_logs.items()]
+        runs = [future.result() for future in futures]
+
+    synth_runs = [run for run in runs if not is_impl_run(run[0])]
+    impl_runs = [run for run in runs if is_impl_run(run[0])]
 
+    with open(LOG_FILE, "w") as log:
+        log.write("Warnings, critical warnings, and errors from synthesis and implementation\n")
+        log.write(f"Created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
 
-with open(LOG_FILE, "r") as file:
-    log_content = file.read()
+        write_section(log, "SYNTHESIS", synth_runs, "No synthesis log file found!")
+        write_section(log, "IMPLEMENTATION", impl_runs, "No implementation log file found!")
+        write_id_summary(log, runs)
 
-log_content = re.sub(r"[A-Za-z]:\\.*?\\fpga\\build\\", "", log_content)
+    print(f"Log summary saved to {LOG_FILE}")
 
-with open(LOG_FILE, "w") as file:
-    file.write(log_content)
 
-print(f"Log summary saved to {LOG_FILE}")
+if __name__ == "__main__":
+    main()